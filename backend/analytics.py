@@ -0,0 +1,160 @@
+from __future__ import annotations
+
+import re
+from datetime import date, datetime, timedelta, timezone
+from typing import Dict, Iterable, List, Optional
+
+from sqlalchemy import func
+from sqlmodel import Session, select
+
+from cache import read_cache
+from models import DailyActivityRollup
+
+# ==========================================================
+# 1️⃣  Parameters
+# ==========================================================
+MAX_WINDOW_DAYS = 731
+GROUP_COLUMNS = {
+    "resident": DailyActivityRollup.resident_id,
+    "goal": DailyActivityRollup.goal_id,
+    "staff": DailyActivityRollup.staff_name,
+}
+GROUP_FIELDS = {"resident": "resident_id", "goal": "goal_id", "staff": "staff_name"}
+_WINDOW = re.compile(r"^(\d+)([dw])$")
+
+
+def parse_window(window: str) -> int:
+    """``"7d"`` -> 7 days, ``"4w"`` -> 28 days; raises ``ValueError`` otherwise."""
+    match = _WINDOW.match(window)
+    if not match:
+        raise ValueError(f"window must look like '7d' or '4w', not {window!r}")
+    days = int(match.group(1)) * (7 if match.group(2) == "w" else 1)
+    if not 1 <= days <= MAX_WINDOW_DAYS:
+        raise ValueError(f"window must be between 1 and {MAX_WINDOW_DAYS} days")
+    return days
+
+
+def _today() -> date:
+    return datetime.now(timezone.utc).date()
+
+
+def _week_start(day: date) -> date:
+    return day - timedelta(days=day.weekday())  # Monday
+
+
+# ==========================================================
+# 2️⃣  Leaderboard
+# ==========================================================
+def leaderboard(
+    session: Session,
+    *,
+    by: str = "resident",
+    window_days: int = 7,
+    rank_by: str = "points",
+    limit: int = 10,
+    today: Optional[date] = None,
+) -> List[dict]:
+    """Top residents, goals or staff members over the last ``window_days`` days (today included).
+
+    Returns ``LeaderboardEntry``-shaped dicts, ready for ``encode``.
+
+    ``rank_by="transactions"`` ranks by how often something happened (e.g.
+    most-completed goals) instead of by points.
+    """
+    today = today or _today()
+    key = GROUP_COLUMNS[by]
+    points = func.sum(DailyActivityRollup.points)
+    count = func.sum(DailyActivityRollup.transaction_count)
+    order = (points.desc(), count.desc()) if rank_by == "points" else (count.desc(), points.desc())
+    rows = session.exec(
+        select(key, points, count)
+        .where(DailyActivityRollup.day > today - timedelta(days=window_days), DailyActivityRollup.day <= today)
+        .group_by(key)
+        .order_by(*order, key)
+        .limit(limit)
+    ).all()
+
+    labels = _labels(session, by, [row[0] for row in rows])
+    return [
+        {
+            "rank": rank,
+            **dict.fromkeys(GROUP_FIELDS.values()),
+            GROUP_FIELDS[by]: ident,
+            "label": labels.get(ident, f"#{ident}"),
+            "points": pts or 0,
+            "transaction_count": n or 0,
+        }
+        for rank, (ident, pts, n) in enumerate(rows, start=1)
+    ]
+
+
+def _labels(session: Session, by: str, idents: Iterable) -> Dict:
+    """Display names for the ranked keys, from the read cache."""
+    if by == "staff":
+        return {name: name for name in idents}
+    if by == "goal":
+        return {gid: goal.title for gid, goal in read_cache.get_many(session, "goal", idents).items()}
+    return {
+        rid: resident.display_name or f"{resident.first_name} {resident.last_name}"
+        for rid, resident in read_cache.get_many(session, "resident", idents).items()
+    }
+
+
+# ==========================================================
+# 3️⃣  Time series
+# ==========================================================
+def timeseries(
+    session: Session,
+    *,
+    bucket: str = "day",
+    group_by: Optional[str] = None,
+    window_days: int = 30,
+    resident_id: Optional[int] = None,
+    goal_id: Optional[int] = None,
+    staff_name: Optional[str] = None,
+    today: Optional[date] = None,
+) -> List[dict]:
+    """Points and transaction counts per day or week, optionally one series per ``group_by`` key.
+
+    Week buckets start on Monday and the window is widened back to a Monday
+    so the first week is complete. Without ``group_by`` every bucket in the
+    window is present (zero when nothing happened), ready for charting.
+    Returns ``TimeseriesPoint``-shaped dicts.
+    """
+    today = today or _today()
+    first_day = today - timedelta(days=window_days - 1)
+    if bucket == "week":
+        first_day = _week_start(first_day)
+
+    key = GROUP_COLUMNS[group_by] if group_by else None
+    columns = [DailyActivityRollup.day] + ([key] if key is not None else [])
+    statement = select(
+        *columns, func.sum(DailyActivityRollup.points), func.sum(DailyActivityRollup.transaction_count)
+    ).where(DailyActivityRollup.day >= first_day, DailyActivityRollup.day <= today)
+    if resident_id is not None:
+        statement = statement.where(DailyActivityRollup.resident_id == resident_id)
+    if goal_id is not None:
+        statement = statement.where(DailyActivityRollup.goal_id == goal_id)
+    if staff_name is not None:
+        statement = statement.where(DailyActivityRollup.staff_name == staff_name)
+
+    to_bucket = _week_start if bucket == "week" else (lambda day: day)
+    totals: Dict[tuple, List[int]] = {}
+    if key is None:
+        step = timedelta(days=7 if bucket == "week" else 1)
+        start = first_day
+        while start <= today:
+            totals[(start, None)] = [0, 0]
+            start += step
+    for row in session.exec(statement.group_by(*columns)):
+        day, ident = row[0], (row[1] if key is not None else None)
+        entry = totals.setdefault((to_bucket(day), ident), [0, 0])
+        entry[0] += row[-2] or 0
+        entry[1] += row[-1] or 0
+
+    field = GROUP_FIELDS[group_by] if group_by else None
+    empty = dict.fromkeys(GROUP_FIELDS.values())
+    return [
+        {"bucket": start, **empty, **({field: ident} if field else {}), "points": pts, "transaction_count": n}
+        for (start, ident), (pts, n) in sorted(totals.items())
+    ]
@@ -0,0 +1,173 @@
+from __future__ import annotations
+
+import argparse
+import os
+from datetime import datetime, timedelta
+from typing import Any, Callable, Iterable, List, Sequence, Set
+
+from sqlalchemy import DateTime, Select, Subquery, case, delete, func, insert, literal, union_all, update
+from sqlmodel import Session, select
+
+from changes import record_changes
+from models import Goal, ResidentBalanceSnapshot, Transaction, TransactionArchive, utc_now
+
+# ==========================================================
+# 1️⃣  Hot and cold ledger as one
+# ==========================================================
+ARCHIVE_BATCH_SIZE = 1000
+LEDGER_FIELDS = [column.key for column in Transaction.__table__.c]
+
+
+def whole_ledger(build: Callable[[Any], Select]) -> Subquery:
+    """``build(model)`` run over hot and archived transactions, as one subquery.
+
+    ``build`` is called with ``Transaction`` and with ``TransactionArchive``
+    (same column names). Filter inside it so each branch uses its own indexes.
+    """
+    return union_all(build(Transaction), build(TransactionArchive)).subquery("ledger")
+
+
+def goals_in_use(session: Session, goal_ids: Iterable[int]) -> Set[int]:
+    """The subset of ``goal_ids`` that hot or archived transactions still reference."""
+    goal_ids = sorted(set(goal_ids))
+    if not goal_ids:
+        return set()
+    ledger = whole_ledger(lambda model: select(model.goal_id).where(model.goal_id.in_(goal_ids)).distinct())
+    return set(session.exec(select(ledger.c.goal_id)))
+
+
+# ==========================================================
+# 2️⃣  Archival (hot -> cold, in batches)
+# ==========================================================
+def archive_transactions(session: Session, before: datetime, batch_size: int = ARCHIVE_BATCH_SIZE) -> int:
+    """Move transactions older than ``before`` (naive UTC) to ``transaction_archive``; returns the count.
+
+    Each batch is one DB transaction: copy the rows, fold their totals into
+    the residents' balance snapshots, delete them from the hot table and bump
+    the transaction table version so list ETags change. No tombstones are
+    written; the rows still exist. Balances and rollups already include them
+    and are left alone.
+    """
+    newest = session.exec(select(func.max(Transaction.id))).one()
+    if newest is None:
+        return 0
+
+    moved = 0
+    columns = [Transaction.__table__.c[name] for name in LEDGER_FIELDS]
+    while True:
+        # The newest row always stays hot: SQLite hands out max(id) + 1, so an
+        # emptied table would reuse ids that now live in the archive.
+        ids = list(
+            session.exec(
+                select(Transaction.id)
+                .where(Transaction.timestamp < before, Transaction.id < newest)
+                .order_by(Transaction.timestamp, Transaction.id)
+                .limit(batch_size)
+            )
+        )
+        if not ids:
+            return moved
+
+        archived_at = literal(utc_now(), DateTime())
+        session.exec(
+            insert(TransactionArchive).from_select(
+                LEDGER_FIELDS + ["archived_at"], select(*columns, archived_at).where(Transaction.id.in_(ids))
+            )
+        )
+        totals = session.exec(
+            select(
+                Transaction.resident_id,
+                func.sum(Transaction.points),
+                func.count(),
+                func.max(Transaction.timestamp),
+            )
+            .where(Transaction.id.in_(ids))
+            .group_by(Transaction.resident_id)
+        ).all()
+        _add_to_snapshots(session, totals)
+        session.exec(delete(Transaction).where(Transaction.id.in_(ids)))
+        record_changes(session, changed={"transaction": []})
+        session.commit()
+        moved += len(ids)
+
+
+def _add_to_snapshots(session: Session, totals: Sequence[tuple]) -> None:
+    """Add per-resident ``(resident_id, points, count, newest)`` totals to the snapshots.
+
+    Plain INSERT for new residents plus one UPDATE ... CASE for the rest,
+    which works the same on every dialect.
+    """
+    by_resident = {rid: (points, count, newest) for rid, points, count, newest in totals}
+    existing = set(
+        session.exec(
+            select(ResidentBalanceSnapshot.resident_id).where(ResidentBalanceSnapshot.resident_id.in_(by_resident))
+        )
+    )
+    new_rows = [
+        {"resident_id": rid, "points": points, "transaction_count": count, "archived_through": newest}
+        for rid, (points, count, newest) in sorted(by_resident.items())
+        if rid not in existing
+    ]
+    if new_rows:
+        session.exec(insert(ResidentBalanceSnapshot).values(new_rows))
+    if not existing:
+        return
+
+    snapshot = ResidentBalanceSnapshot
+    newest = case({rid: by_resident[rid][2] for rid in existing}, value=snapshot.resident_id)
+    session.exec(
+        update(snapshot)
+        .where(snapshot.resident_id.in_(sorted(existing)))
+        .values(
+            points=snapshot.points + case({rid: by_resident[rid][0] for rid in existing}, value=snapshot.resident_id),
+            transaction_count=snapshot.transaction_count
+            + case({rid: by_resident[rid][1] for rid in existing}, value=snapshot.resident_id),
+            archived_through=case(
+                (snapshot.archived_through.is_(None), newest),
+                (snapshot.archived_through < newest, newest),
+                else_=snapshot.archived_through,
+            ),
+        )
+        .execution_options(synchronize_session=False)
+    )
+
+
+# ==========================================================
+# 3️⃣  Deferred purge of deleted goals
+# ==========================================================
+def purge_deleted_goals(session: Session) -> List[int]:
+    """Hard-delete soft-deleted goals that no transaction references any more, and commit.
+
+    A goal stops being referenced once the residents who earned tokens on it
+    are deleted. Its tombstone was written when it was soft-deleted.
+    """
+    retired = list(session.exec(select(Goal.id).where(Goal.deleted_at.is_not(None))))
+    unused = sorted(set(retired) - goals_in_use(session, retired))
+    if unused:
+        session.exec(delete(Goal).where(Goal.id.in_(unused)))
+    session.commit()
+    return unused
+
+
+if __name__ == "__main__":
+    from database import engine
+
+    parser = argparse.ArgumentParser(description="Move old transactions to the cold archive; purge deleted goals.")
+    parser.add_argument("command", choices=["archive", "purge"])
+    parser.add_argument(
+        "--older-than-days",
+        type=int,
+        default=int(os.getenv("ARCHIVE_AFTER_DAYS", "365")),
+        help="archive: move transactions older than this many days (default $ARCHIVE_AFTER_DAYS or 365)",
+    )
+    parser.add_argument("--batch-size", type=int, default=ARCHIVE_BATCH_SIZE, help="archive: rows per DB transaction")
+    args = parser.parse_args()
+
+    with Session(engine) as session:
+        if args.command == "archive":
+            cutoff = utc_now() - timedelta(days=args.older_than_days)
+            moved = archive_transactions(session, cutoff, batch_size=args.batch_size)
+            print(f"Archived {moved} transaction(s) from before {cutoff:%Y-%m-%d %H:%M} UTC.")
+        else:
+            purged = purge_deleted_goals(session)
+            print(f"Purged {len(purged)} deleted goal(s) no longer referenced by the ledger.")
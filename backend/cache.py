@@ -0,0 +1,237 @@
+from __future__ import annotations
+
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Hashable, Iterable, Optional, Tuple
+
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+from sqlmodel import select
+
+from models import Goal, Resident, TableVersion
+from serialization import encode_rows, table_columns
+
+# ==========================================================
+# 1️⃣  Size-bounded TTL cache
+# ==========================================================
+class TTLCache:
+    """LRU mapping whose entries also expire ``ttl`` seconds after they were loaded.
+
+    ``clear()`` bumps a generation counter; a load that started before the
+    clear is not stored, so a slow reader can't put pre-write data back.
+    """
+
+    def __init__(self, maxsize: int, ttl: float) -> None:
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.generation = 0
+        self._entries: "OrderedDict[Hashable, Tuple[float, Any]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.stats = {"hits": 0, "misses": 0, "evictions": 0, "expirations": 0, "invalidations": 0}
+
+    def get_or_load(self, key: Hashable, load: Callable[[], Any]) -> Any:
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                if entry[0] > now:
+                    self._entries.move_to_end(key)
+                    self.stats["hits"] += 1
+                    return entry[1]
+                del self._entries[key]
+                self.stats["expirations"] += 1
+            self.stats["misses"] += 1
+            generation = self.generation
+
+        value = load()
+        if value is not None:  # misses are not cached; new rows must show up at once
+            self.put(key, value, generation)
+        return value
+
+    def peek(self, key: Hashable) -> Any:
+        """Cached value or ``None``, counting hits and misses like ``get_or_load``."""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] > time.monotonic():
+                self._entries.move_to_end(key)
+                self.stats["hits"] += 1
+                return entry[1]
+            self.stats["misses"] += 1
+            return None
+
+    def put(self, key: Hashable, value: Any, generation: Optional[int] = None) -> None:
+        with self._lock:
+            if generation is not None and generation != self.generation:
+                return
+            self._entries[key] = (time.monotonic() + self.ttl, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+                self.stats["evictions"] += 1
+
+    def clear(self) -> None:
+        with self._lock:
+            self.generation += 1
+            self._entries.clear()
+            self.stats["invalidations"] += 1
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._lock:
+            return {**self.stats, "entries": len(self._entries), "max_entries": self.maxsize, "ttl_seconds": self.ttl}
+
+
+# ==========================================================
+# 2️⃣  Read-through cache for residents and goals
+# ==========================================================
+CACHED_MODELS = {"goal": Goal, "resident": Resident}
+
+
+def _detach(session: Session, rows):
+    """Take loaded rows out of ``session`` so a later commit there can't expire the cached copies."""
+    for row in rows if isinstance(rows, list) else [rows]:
+        if row is not None and row in session:
+            session.expunge(row)
+    return rows
+
+
+def _env_staleness() -> Optional[float]:
+    raw = os.getenv("CACHE_MAX_STALENESS_SECONDS", "1").strip().lower()
+    return None if raw in ("", "off", "none") else float(raw)
+
+
+class ReadCache:
+    """Per-worker cache of the rarely-changing tables.
+
+    Writes in this worker invalidate on commit (``record_changes`` calls
+    ``invalidate_on_commit``). Writes in other workers are noticed by
+    re-reading the ``table_version`` counter at most every
+    ``max_staleness`` seconds; a changed version drops that table's entries.
+    ``max_staleness=None`` turns the cross-worker check off and leaves only
+    the TTL (fine for a single worker). Cached objects are shared between
+    requests and must not be modified.
+    """
+
+    def __init__(self, enabled: bool, ttl: float, maxsize: int, max_staleness: Optional[float]) -> None:
+        self.enabled = enabled
+        self.max_staleness = max_staleness
+        self.tables = {name: TTLCache(maxsize, ttl) for name in CACHED_MODELS}
+        self._versions: Dict[str, Tuple[float, TableVersion]] = {}
+        self._lock = threading.Lock()
+        self.stats = {"version_checks": 0, "remote_invalidations": 0}
+
+    @classmethod
+    def from_env(cls) -> "ReadCache":
+        return cls(
+            enabled=os.getenv("CACHE_ENABLED", "true").strip().lower() in ("1", "true", "yes"),
+            ttl=float(os.getenv("CACHE_TTL_SECONDS", "60")),
+            maxsize=int(os.getenv("CACHE_MAX_ENTRIES", "1024")),
+            max_staleness=_env_staleness(),
+        )
+
+    # -- table_version tracking ---------------------------------------------
+    def table_state(self, session: Session, table: str) -> Optional[TableVersion]:
+        """The table's counter row, re-read from the database at most every ``max_staleness`` seconds."""
+        if not self.enabled or table not in self.tables:
+            return session.get(TableVersion, table)
+        now = time.monotonic()
+        with self._lock:
+            known = self._versions.get(table)
+        if known is not None and (self.max_staleness is None or now - known[0] < self.max_staleness):
+            return known[1]
+
+        generation = self.tables[table].generation
+        row = session.get(TableVersion, table)
+        if row is None:
+            return None
+        state = TableVersion(
+            table_name=row.table_name, version=row.version, updated_at=row.updated_at, pruned_through=row.pruned_through
+        )
+        with self._lock:
+            self.stats["version_checks"] += 1
+            if generation != self.tables[table].generation:
+                return state  # a local commit landed mid-read; don't remember this copy
+            if known is not None and known[1].version != state.version:
+                self.stats["remote_invalidations"] += 1
+                self.tables[table].clear()
+            self._versions[table] = (now, state)
+        return state
+
+    # -- entity reads -----------------------------------------------------------
+    def all_json(self, session: Session, table: str) -> bytes:
+        """Every row of ``table`` (``"goal"`` or ``"resident"``) as an encoded JSON array.
+
+        The list endpoints send these bytes as-is, so a hit costs neither a
+        query nor serialization.
+        """
+        model = CACHED_MODELS[table]
+        statement = select(*table_columns(model))
+        if "deleted_at" in model.__table__.c:  # soft-deleted rows are kept for history, not listed
+            statement = statement.where(model.deleted_at.is_(None))
+        if not self.enabled:
+            return encode_rows(session.exec(statement).all())
+        self.table_state(session, table)
+        return self.tables[table].get_or_load(("all_json",), lambda: encode_rows(session.exec(statement).all()))
+
+    def get(self, session: Session, table: str, ident: int) -> Optional[Any]:
+        """One row by primary key (``session.get`` semantics); missing rows are not cached."""
+        model = CACHED_MODELS[table]
+        if not self.enabled:
+            return session.get(model, ident)
+        self.table_state(session, table)
+        return self.tables[table].get_or_load(("id", ident), lambda: _detach(session, session.get(model, ident)))
+
+    def get_many(self, session: Session, table: str, idents: Iterable[int]) -> Dict[int, Any]:
+        """Rows for ``idents`` keyed by id; everything not cached comes back in one IN query."""
+        model = CACHED_MODELS[table]
+        idents = set(idents)
+        if not self.enabled:
+            return {row.id: row for row in session.exec(select(model).where(model.id.in_(idents)))}
+        self.table_state(session, table)
+        cache = self.tables[table]
+        found = {}
+        for ident in idents:
+            row = cache.peek(("id", ident))
+            if row is not None:
+                found[ident] = row
+        missing = idents - set(found)
+        if missing:
+            generation = cache.generation
+            for row in _detach(session, list(session.exec(select(model).where(model.id.in_(missing))))):
+                found[row.id] = row
+                cache.put(("id", row.id), row, generation)
+        return found
+
+    # -- invalidation -----------------------------------------------------------
+    def invalidate(self, tables: Iterable[str]) -> None:
+        for table in tables:
+            if table in self.tables:
+                self.tables[table].clear()
+                with self._lock:
+                    self._versions.pop(table, None)
+
+    def invalidate_on_commit(self, session: Session, tables: Iterable[str]) -> None:
+        """Drop ``tables`` once ``session`` commits (nothing happens on rollback)."""
+        session.info.setdefault("invalidate_tables", set()).update(tables)
+
+    def snapshot(self) -> Dict[str, Any]:
+        return {
+            "enabled": self.enabled,
+            "max_staleness_seconds": self.max_staleness,
+            **self.stats,
+            "tables": {name: cache.snapshot() for name, cache in self.tables.items()},
+        }
+
+
+read_cache = ReadCache.from_env()
+
+
+@event.listens_for(Session, "after_commit")
+def _invalidate_committed(session: Session) -> None:
+    read_cache.invalidate(session.info.pop("invalidate_tables", ()))
+
+
+@event.listens_for(Session, "after_rollback")
+def _discard_invalidations(session: Session) -> None:
+    session.info.pop("invalidate_tables", None)
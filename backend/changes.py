@@ -0,0 +1,236 @@
+from __future__ import annotations
+
+import argparse
+import os
+from datetime import datetime, timedelta, timezone
+from email.utils import format_datetime, parsedate_to_datetime
+from typing import Dict, Iterable, List, Optional
+
+from fastapi import Request, Response
+from sqlalchemy import delete, func, insert, update
+from sqlmodel import Session, select
+
+from cache import read_cache
+from events import change_messages, queue_event
+from models import Goal, Resident, TableVersion, Tombstone, Transaction, utc_now
+
+# ==========================================================
+# 1️⃣  Per-table change counters
+# ==========================================================
+TRACKED_TABLES = {"goal": Goal, "resident": Resident, "transaction": Transaction}
+
+SYNC_HEADERS = ["ETag", "Last-Modified", "X-Sync-Cursor", "X-Deleted-Ids"]
+
+# Past this many deletions a ?since= client is told to reload rather than
+# handed an X-Deleted-Ids header that proxies may reject.
+MAX_DELETED_IDS = 500
+
+
+class ChangeLogExpired(LookupError):
+    """The requested ``since`` cursor is older than the retained tombstones."""
+
+
+def ensure_counters(session: Session) -> None:
+    """Create missing counter rows (run once at startup).
+
+    INSERT ... ON CONFLICT DO NOTHING, so workers starting together on a fresh
+    database don't trip over each other's rows.
+    """
+    dialect = session.get_bind().dialect.name
+    if dialect == "postgresql":
+        from sqlalchemy.dialects.postgresql import insert as dialect_insert
+    elif dialect == "sqlite":
+        from sqlalchemy.dialects.sqlite import insert as dialect_insert
+    else:
+        raise NotImplementedError(f"Counter seeding is not implemented for {dialect!r}")
+
+    now = utc_now()
+    rows = [
+        {"table_name": name, "version": 0, "updated_at": now, "pruned_through": 0} for name in sorted(TRACKED_TABLES)
+    ]
+    session.exec(dialect_insert(TableVersion).values(rows).on_conflict_do_nothing(index_elements=["table_name"]))
+    session.commit()
+
+
+def record_changes(
+    session: Session,
+    changed: Optional[Dict[str, Iterable[int]]] = None,
+    deleted: Optional[Dict[str, Iterable[int]]] = None,
+) -> Dict[str, int]:
+    """Bump the counters for every touched table and stamp rows/tombstones with the new version.
+
+    Call this as the last step before ``commit()``: the counter row stays locked
+    until commit, so versions become visible in the same order they were issued
+    and a ``?since=`` reader can never skip one. Matching live events are
+    published to ``/events`` subscribers, and this worker's read cache is
+    invalidated, once the session commits.
+    """
+    changed = {name: list(ids) for name, ids in (changed or {}).items()}
+    deleted = {name: list(ids) for name, ids in (deleted or {}).items()}
+    tables = sorted(set(changed) | set(deleted))  # fixed lock order
+    if not tables:
+        return {}
+
+    now = utc_now()
+    versions = dict(
+        session.exec(
+            update(TableVersion)
+            .where(TableVersion.table_name.in_(tables))
+            .values(version=TableVersion.version + 1, updated_at=now)
+            .returning(TableVersion.table_name, TableVersion.version)
+            .execution_options(synchronize_session=False)
+        ).all()
+    )
+    for name in tables:
+        if name not in versions:  # counters not seeded yet
+            session.add(TableVersion(table_name=name, version=1, updated_at=now))
+            session.flush()
+            versions[name] = 1
+
+    for name, ids in changed.items():
+        if ids:
+            model = TRACKED_TABLES[name]
+            session.exec(
+                update(model)
+                .where(model.id.in_(ids))
+                .values(change_seq=versions[name])
+                .execution_options(synchronize_session=False)
+            )
+    for name, ids in deleted.items():
+        if ids:  # one executemany, however many rows a cascade removed
+            session.exec(
+                insert(Tombstone),
+                params=[
+                    {"table_name": name, "row_id": row_id, "change_seq": versions[name], "deleted_at": now}
+                    for row_id in ids
+                ],
+            )
+    for message in change_messages(versions, changed, deleted):
+        queue_event(session, message)
+    read_cache.invalidate_on_commit(session, tables)
+    return versions
+
+
+def prune_tombstones(session: Session, keep_days: int = 30) -> int:
+    """Discard old tombstones; clients syncing from before the cut-off get 410 and reload.
+
+    Returns how many tombstones were removed.
+    """
+    cutoff = utc_now() - timedelta(days=keep_days)
+    removed = 0
+    for name in TRACKED_TABLES:
+        newest_pruned = session.exec(
+            select(func.max(Tombstone.change_seq)).where(
+                Tombstone.table_name == name, Tombstone.deleted_at < cutoff
+            )
+        ).one()
+        if newest_pruned is None:
+            continue
+        removed += session.exec(
+            delete(Tombstone).where(Tombstone.table_name == name, Tombstone.change_seq <= newest_pruned)
+        ).rowcount
+        session.exec(
+            update(TableVersion)
+            .where(TableVersion.table_name == name)
+            .values(pruned_through=newest_pruned)
+            .execution_options(synchronize_session=False)
+        )
+    session.commit()
+    return removed
+
+
+# ==========================================================
+# 2️⃣  Conditional GET and delta sync
+# ==========================================================
+def current_versions(session: Session) -> Dict[str, int]:
+    return {name: version for name, version in session.exec(select(TableVersion.table_name, TableVersion.version))}
+
+
+def table_state(session: Session, table: str, cached: bool = False) -> TableVersion:
+    """Current counter row for ``table`` (a single primary-key lookup).
+
+    ``cached=True`` accepts the read cache's copy, which lags other workers'
+    writes by at most ``CACHE_MAX_STALENESS_SECONDS``.
+    """
+    state = read_cache.table_state(session, table) if cached else session.get(TableVersion, table)
+    return state or TableVersion(table_name=table, version=0, updated_at=datetime(1970, 1, 1))
+
+
+def check_not_modified(request: Request, response: Response, session: Session, table: str) -> Optional[Response]:
+    """Set sync headers on ``response``; return a 304 response if the client's copy is current.
+
+    Callers return the 304 straight away, before running their list query.
+    """
+    state = table_state(session, table, cached=True)
+    updated_at = state.updated_at
+    if updated_at.tzinfo is None:
+        updated_at = updated_at.replace(tzinfo=timezone.utc)
+
+    headers = {
+        "ETag": f'"{table}-{state.version}"',
+        "Last-Modified": format_datetime(updated_at.astimezone(timezone.utc), usegmt=True),
+        "Cache-Control": "no-cache",  # browsers revalidate with If-None-Match every time
+        "X-Sync-Cursor": str(state.version),
+    }
+    response.headers.update(headers)
+
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match is not None:
+        tags = {tag.strip().removeprefix("W/") for tag in if_none_match.split(",")}
+        if headers["ETag"] in tags or "*" in tags:
+            return Response(status_code=304, headers=headers)
+        return None
+
+    if_modified_since = request.headers.get("if-modified-since")
+    if if_modified_since:
+        try:
+            since = parsedate_to_datetime(if_modified_since)
+        except (TypeError, ValueError):
+            return None
+        # Same one-second truncation as the Last-Modified header, so a client
+        # echoing it back gets its 304. A second write within that same second
+        # is invisible here; If-None-Match (checked first) is exact.
+        if updated_at.replace(microsecond=0) <= since:
+            return Response(status_code=304, headers=headers)
+    return None
+
+
+def deleted_since(session: Session, response: Response, table: str, since: int) -> List[int]:
+    """Ids deleted from ``table`` after ``since``; also written to ``X-Deleted-Ids``.
+
+    Raises ``ChangeLogExpired`` when the tombstones have been pruned, or when
+    there are more than ``MAX_DELETED_IDS`` of them (a full reload is cheaper).
+    """
+    state = table_state(session, table)
+    if since < state.pruned_through:
+        raise ChangeLogExpired(f"Changes before version {state.pruned_through} are no longer retained; reload")
+    ids = list(
+        session.exec(
+            select(Tombstone.row_id)
+            .where(Tombstone.table_name == table, Tombstone.change_seq > since)
+            .order_by(Tombstone.change_seq)
+            .limit(MAX_DELETED_IDS + 1)
+        )
+    )
+    if len(ids) > MAX_DELETED_IDS:
+        raise ChangeLogExpired(f"More than {MAX_DELETED_IDS} {table} rows deleted since version {since}; reload")
+    response.headers["X-Deleted-Ids"] = ",".join(str(i) for i in ids)
+    return ids
+
+
+if __name__ == "__main__":
+    from database import engine
+
+    parser = argparse.ArgumentParser(description="Discard old tombstones from the ?since= change log.")
+    parser.add_argument("command", choices=["prune"])
+    parser.add_argument(
+        "--keep-days",
+        type=int,
+        default=int(os.getenv("TOMBSTONE_KEEP_DAYS", "30")),
+        help="keep tombstones from the last this many days (default $TOMBSTONE_KEEP_DAYS or 30)",
+    )
+    args = parser.parse_args()
+
+    with Session(engine) as session:
+        removed = prune_tombstones(session, keep_days=args.keep_days)
+        print(f"Pruned {removed} tombstone(s) older than {args.keep_days} day(s).")
@@ -1,71 +1,242 @@
 ﻿from __future__ import annotations
+import logging
 import os
 import ssl
-from typing import Generator
+from abc import ABC, abstractmethod
+from contextlib import asynccontextmanager
+from dataclasses import dataclass
+from typing import Any, AsyncGenerator, AsyncIterator, Callable, Dict, Generator, Optional, Sequence, TypeVar
+import anyio
 from dotenv import load_dotenv
+from fastapi.concurrency import run_in_threadpool
 from sqlmodel import SQLModel, create_engine, Session
+from sqlmodel.ext.asyncio.session import AsyncSession
+from sqlalchemy import inspect, text
+from sqlalchemy.engine import URL, Engine
 from sqlalchemy.engine.url import make_url
-from sqlalchemy.pool import NullPool
+from sqlalchemy.ext.asyncio import AsyncEngine, create_async_engine
+from sqlalchemy.pool import StaticPool
 import pg8000
 
+from metrics import instrument_engine
+from pooling import TimedAsyncQueuePool, TimedQueuePool, instrument, pool_status
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
 
 # ==========================================================
-# 1️⃣  Load environment and build database URL
+# 1️⃣  Load environment and engine configuration
 # ==========================================================
 load_dotenv()
 
-DATABASE_URL = os.getenv("DATABASE_URL")
-if not DATABASE_URL:
-    raise ValueError("DATABASE_URL not found in .env file")
+SYNC_DRIVERS = ("pg8000", "psycopg", "psycopg2", "sqlite")
+
+
+def _env_bool(name: str, default: bool = False) -> bool:
+    return os.getenv(name, str(default)).strip().lower() in ("1", "true", "yes")
+
+
+@dataclass(frozen=True)
+class EngineConfig:
+    """Everything that shapes the engines, read from the environment.
 
-# Ensure driver explicitly uses pg8000 (Supabase + IPv4 compatible)
-if "pg8000" not in DATABASE_URL:
-    DATABASE_URL = DATABASE_URL.replace("postgresql://", "postgresql+pg8000://")
+    | Variable                  | Default  | Meaning                                         |
+    | ------------------------- | -------- | ----------------------------------------------- |
+    | DATABASE_URL              | required | ``sqlite://`` alone means an in-memory stand-in |
+    | DB_DRIVER                 | from URL | pg8000, psycopg, psycopg2 or sqlite             |
+    | DB_ASYNC                  | false    | asyncpg / aiosqlite request path                |
+    | DB_POOL_SIZE              | 5        | connections kept open per worker                |
+    | DB_MAX_OVERFLOW           | 10       | extra connections opened under load             |
+    | DB_POOL_TIMEOUT           | 30       | seconds a checkout waits before failing         |
+    | DB_POOL_RECYCLE           | 1800     | seconds before a connection is replaced         |
+    | DB_PRE_PING               | always   | always, idle or off (see pooling.instrument)    |
+    | DB_PRE_PING_IDLE_SECONDS  | 30       | idle time before a ping under ``idle``          |
+    | DB_STATEMENT_TIMEOUT_MS   | 0 (off)  | PostgreSQL statement_timeout                    |
+    | DB_ECHO                   | false    | log every statement                             |
+    """
 
-# Parse and verify URL
-url = make_url(DATABASE_URL)
-driver = url.get_backend_name().lower() if url else ""
-if driver == "postgresql":
-    # SQLAlchemy sometimes strips '+pg8000'
-    driver = "pg8000"
-print(f"Effective driver: {driver}")
+    url: URL
+    driver: str
+    use_async: bool = False
+    pool_size: int = 5
+    max_overflow: int = 10
+    pool_timeout: float = 30.0
+    pool_recycle: int = 1800
+    pre_ping: str = "always"
+    pre_ping_idle_seconds: float = 30.0
+    statement_timeout_ms: int = 0
+    echo: bool = False
+
+    @property
+    def is_sqlite(self) -> bool:
+        return self.driver == "sqlite"
+
+    @property
+    def in_memory(self) -> bool:
+        return self.is_sqlite and self.url.database in (None, "", ":memory:")
+
+    @classmethod
+    def from_env(cls) -> "EngineConfig":
+        raw_url = os.getenv("DATABASE_URL")
+        if not raw_url:
+            raise ValueError("DATABASE_URL not found in .env file (use sqlite:// for an in-memory stand-in)")
+        url = make_url(raw_url)
+        if url.get_backend_name() == "sqlite":
+            scheme_driver = "sqlite"
+        else:
+            # Only a driver spelled out in the URL counts; get_driver_name() on a bare
+            # postgresql:// (the Supabase format) reports psycopg2, which isn't installed.
+            scheme_driver = url.get_driver_name() if "+" in url.drivername else ""
+        driver = os.getenv("DB_DRIVER", "").strip().lower() or scheme_driver
+        if driver not in SYNC_DRIVERS:
+            # A bare postgresql:// URL (or an async driver name) gets the default pg8000.
+            driver = "pg8000"
+        return cls(
+            url=url,
+            driver=driver,
+            use_async=_env_bool("DB_ASYNC"),
+            pool_size=int(os.getenv("DB_POOL_SIZE", "5")),
+            max_overflow=int(os.getenv("DB_MAX_OVERFLOW", "10")),
+            pool_timeout=float(os.getenv("DB_POOL_TIMEOUT", "30")),
+            pool_recycle=int(os.getenv("DB_POOL_RECYCLE", "1800")),
+            pre_ping=os.getenv("DB_PRE_PING", "always").strip().lower(),
+            pre_ping_idle_seconds=float(os.getenv("DB_PRE_PING_IDLE_SECONDS", "30")),
+            statement_timeout_ms=int(os.getenv("DB_STATEMENT_TIMEOUT_MS", "0")),
+            echo=_env_bool("DB_ECHO"),
+        )
+
+    def describe(self) -> Dict[str, Any]:
+        """Settings safe to show on internal endpoints (no credentials)."""
+        return {
+            "driver": self.driver,
+            "async": self.use_async,
+            "host": self.url.host,
+            "database": ":memory:" if self.in_memory else self.url.database,
+            "pool_size": self.pool_size,
+            "max_overflow": self.max_overflow,
+            "pool_timeout": self.pool_timeout,
+            "pool_recycle": self.pool_recycle,
+            "pre_ping": self.pre_ping,
+            "pre_ping_idle_seconds": self.pre_ping_idle_seconds,
+            "statement_timeout_ms": self.statement_timeout_ms,
+        }
 
 
 # ==========================================================
-# 2️⃣  Prepare SSL and pg8000 connection creator
+# 2️⃣  Connection arguments per driver
 # ==========================================================
+# Supabase's pooler certificate isn't in the default trust store.
 ssl_context = ssl._create_unverified_context()
-host = url.host or "aws-1-us-east-2.pooler.supabase.com"
-port_val = int(url.port or 5432)
-user_val = url.username
-password_val = url.password
-database_val = url.database
-
-
-def _pg8000_creator():
-    """Create a direct pg8000 connection (bypassing SQLAlchemy’s sslmode)."""
-    print(f"Opening pg8000 connection to {host}:{port_val} ...")
-    return pg8000.connect(
-        host=host,
-        port=port_val,
-        user=user_val,
-        password=password_val,
-        database=database_val,
-        ssl_context=ssl_context,
-    )
+
+# In-memory SQLite shared by the sync and async engines of this process.
+SHARED_MEMORY_DB = {"database": "file:token_tracker", "query": {"mode": "memory", "cache": "shared", "uri": "true"}}
+
+
+def _pg8000_creator(config: EngineConfig) -> Callable[[], Any]:
+    """Build a pg8000 connect function (bypassing SQLAlchemy's sslmode handling)."""
+    url = config.url
+    host = url.host or "aws-1-us-east-2.pooler.supabase.com"
+    port = int(url.port or 5432)
+    # Sent in the startup packet. Poolers in transaction mode may not forward
+    # it; set it on the role instead (ALTER ROLE ... SET statement_timeout).
+    startup = {"statement_timeout": str(config.statement_timeout_ms)} if config.statement_timeout_ms else None
+
+    def connect():
+        logger.debug("Opening pg8000 connection to %s:%s", host, port)
+        return pg8000.connect(
+            host=host,
+            port=port,
+            user=url.username,
+            password=url.password,
+            database=url.database,
+            ssl_context=ssl_context,
+            startup_params=startup,
+        )
+
+    return connect
+
+
+def _pool_kwargs(config: EngineConfig, poolclass) -> Dict[str, Any]:
+    if config.in_memory:
+        # One connection shared by every thread, or each checkout sees an empty database.
+        return {"poolclass": StaticPool}
+    return {
+        "poolclass": poolclass,
+        "pool_size": config.pool_size,
+        "max_overflow": config.max_overflow,
+        "pool_timeout": config.pool_timeout,
+        "pool_recycle": config.pool_recycle,
+    }
 
 
 # ==========================================================
-# 3️⃣  Create SQLAlchemy engine using custom connection
+# 3️⃣  Engine factories
 # ==========================================================
-engine = create_engine(
-    "postgresql+pg8000://",
-    creator=_pg8000_creator,
-    pool_pre_ping=True,   # ✅ checks connection health before each use
-    pool_recycle=1800,    # ✅ recycle connections every 30 min
-    echo=False,
-)
-print("Engine created using custom pg8000 creator.")
+def build_engine(config: EngineConfig) -> Engine:
+    """Create the blocking engine described by ``config``."""
+    kwargs = _pool_kwargs(config, TimedQueuePool)
+    if config.is_sqlite:
+        url = config.url.set(**SHARED_MEMORY_DB) if config.in_memory else config.url
+        new_engine = create_engine(url, connect_args={"check_same_thread": False}, echo=config.echo, **kwargs)
+    elif config.driver == "pg8000":
+        new_engine = create_engine(
+            "postgresql+pg8000://", creator=_pg8000_creator(config), echo=config.echo, **kwargs
+        )
+    else:
+        connect_args: Dict[str, Any] = {"sslmode": "require"}
+        if config.statement_timeout_ms:
+            connect_args["options"] = f"-c statement_timeout={config.statement_timeout_ms}"
+        new_engine = create_engine(
+            config.url.set(drivername=f"postgresql+{config.driver}"),
+            connect_args=connect_args,
+            echo=config.echo,
+            **kwargs,
+        )
+    instrument(new_engine, "sync", config.pre_ping, config.pre_ping_idle_seconds)
+    instrument_engine(new_engine, "sync")
+    logger.info("Engine created (%s, pool %s+%s)", config.driver, config.pool_size, config.max_overflow)
+    return new_engine
+
+
+def build_async_engine(config: EngineConfig) -> AsyncEngine:
+    """Create the asyncio engine used when ``DB_ASYNC`` is on."""
+    kwargs = _pool_kwargs(config, TimedAsyncQueuePool)
+    if config.is_sqlite:
+        url = config.url.set(drivername="sqlite+aiosqlite")
+        if config.in_memory:
+            url = url.set(**SHARED_MEMORY_DB)
+        new_engine = create_async_engine(url, echo=config.echo, **kwargs)
+    else:
+        # The Supabase pooler runs in transaction mode, which can't keep
+        # server-side prepared statements between transactions.
+        connect_args: Dict[str, Any] = {"ssl": ssl_context, "statement_cache_size": 0, "prepared_statement_cache_size": 0}
+        if config.statement_timeout_ms:
+            connect_args["server_settings"] = {"statement_timeout": str(config.statement_timeout_ms)}
+        new_engine = create_async_engine(
+            config.url.set(drivername="postgresql+asyncpg"),
+            connect_args=connect_args,
+            echo=config.echo,
+            **kwargs,
+        )
+    instrument(new_engine.sync_engine, "async", config.pre_ping, config.pre_ping_idle_seconds)
+    instrument_engine(new_engine.sync_engine, "async")
+    logger.info("Async engine created (%s)", new_engine.dialect.driver)
+    return new_engine
+
+
+config = EngineConfig.from_env()
+engine = build_engine(config)
+async_engine: Optional[AsyncEngine] = build_async_engine(config) if config.use_async else None
+
+
+def pool_report() -> Dict[str, Any]:
+    """Configuration plus live pool counters for every engine in this worker."""
+    pools = {"sync": pool_status("sync", engine)}
+    if async_engine is not None:
+        pools["async"] = pool_status("async", async_engine.sync_engine)
+    return {"config": config.describe(), "pools": pools}
 
 
 # ==========================================================
@@ -77,11 +248,154 @@ def get_session() -> Generator[Session, None, None]:
         yield session
 
 
+class DB(ABC):
+    """What async endpoints use to run ORM code written in blocking style.
+
+    ``await db.run(fn, ...)`` calls ``fn(session, ...)``: on Starlette's
+    threadpool in sync mode, or through ``AsyncSession.run_sync`` (no thread)
+    in async mode. The same query helpers therefore serve both modes.
+
+    Each call is its own unit of work: the connection goes back to the pool
+    as soon as ``fn`` returns, not when the response has been sent. Returned
+    objects are detached but keep their loaded attributes.
+    """
+
+    @abstractmethod
+    async def run(self, fn: Callable[..., T], *args: Any, **kwargs: Any) -> T:
+        ...
+
+    @abstractmethod
+    def stream(self, statement: Any, batch_size: int) -> AsyncIterator[Sequence[Any]]:
+        """Yield the rows of ``statement`` in lists of up to ``batch_size``.
+
+        Uses a server-side cursor (``yield_per``), so only one batch is held
+        in memory. Unlike ``run`` this keeps the connection checked out until
+        the iterator finishes or is closed; the session is closed after.
+        """
+
+    @abstractmethod
+    async def close(self) -> None:
+        """Return the connection early (e.g. before a long streaming response)."""
+
+
+class _ThreadedDB(DB):
+    def __init__(self, session: Session) -> None:
+        self.session = session
+
+    async def run(self, fn, *args, **kwargs):
+        return await run_in_threadpool(self._call, fn, *args, **kwargs)
+
+    def _call(self, fn, *args, **kwargs):
+        # Release in the same thread hop: requests parked on a connection while
+        # they wait for a free thread to close it can starve the pool.
+        try:
+            return fn(self.session, *args, **kwargs)
+        finally:
+            self.session.close()
+
+    async def stream(self, statement, batch_size):
+        result = await run_in_threadpool(self.session.execute, statement.execution_options(yield_per=batch_size))
+        batches = result.partitions()
+        try:
+            while True:
+                rows = await run_in_threadpool(next, batches, None)
+                if rows is None:
+                    break
+                yield rows
+        finally:
+            with anyio.CancelScope(shield=True):  # a client disconnect must not leak the connection
+                await run_in_threadpool(self._finish, result)
+
+    def _finish(self, result) -> None:
+        try:
+            result.close()
+        finally:
+            self.session.close()
+
+    async def close(self) -> None:
+        # Closing may roll back over the network; keep it off the event loop.
+        await run_in_threadpool(self.session.close)
+
+
+class _AsyncDB(DB):
+    def __init__(self, session: AsyncSession) -> None:
+        self.session = session
+
+    async def run(self, fn, *args, **kwargs):
+        try:
+            return await self.session.run_sync(fn, *args, **kwargs)
+        finally:
+            await self.session.close()
+
+    async def stream(self, statement, batch_size):
+        result = await self.session.stream(statement.execution_options(yield_per=batch_size))
+        try:
+            async for rows in result.partitions():
+                yield rows
+        finally:
+            with anyio.CancelScope(shield=True):
+                try:
+                    await result.close()
+                finally:
+                    await self.session.close()
+
+    async def close(self) -> None:
+        await self.session.close()
+
+
+@asynccontextmanager
+async def db_session() -> AsyncIterator[DB]:
+    """Open a :class:`DB` for the configured mode and close it afterwards."""
+    if async_engine is not None:
+        # expire_on_commit=False: attributes must not lazy-load after run_sync returns.
+        async with AsyncSession(async_engine, expire_on_commit=False) as session:
+            yield _AsyncDB(session)
+    else:
+        db = _ThreadedDB(Session(engine))
+        try:
+            yield db
+        finally:
+            await db.close()
+
+
+async def get_db() -> AsyncGenerator[DB, None]:
+    """Provide a :class:`DB` for FastAPI dependency injection."""
+    async with db_session() as db:
+        yield db
+
+
 # ==========================================================
 # 5️⃣  Database initialization
 # ==========================================================
 def init_db() -> None:
     """Initialize tables on startup."""
-    print("Initializing database...")
+    logger.info("Initializing database...")
     SQLModel.metadata.create_all(engine)
-    print("Database ready.")
+    _add_missing_columns()
+    # create_all skips indexes on tables that already exist; add any new ones.
+    for table in SQLModel.metadata.sorted_tables:
+        for index in table.indexes:
+            index.create(engine, checkfirst=True)
+    logger.info("Database ready.")
+
+
+def _add_missing_columns() -> None:
+    """Add model columns that an existing table predates (create_all never alters tables).
+
+    New columns must be nullable or carry a server_default.
+    """
+    inspector = inspect(engine)
+    ddl = engine.dialect.ddl_compiler(engine.dialect, None)
+    with engine.begin() as conn:
+        for table in SQLModel.metadata.sorted_tables:
+            if not inspector.has_table(table.name):
+                continue
+            existing = {col["name"] for col in inspector.get_columns(table.name)}
+            for column in table.columns:
+                if column.name in existing:
+                    continue
+                logger.info("Adding column %s.%s", table.name, column.name)
+                conn.execute(text(
+                    f"ALTER TABLE {ddl.preparer.format_table(table)} "
+                    f"ADD COLUMN {ddl.get_column_specification(column)}"
+                ))
@@ -0,0 +1,156 @@
+from __future__ import annotations
+
+import asyncio
+import json
+import threading
+from typing import Any, AsyncIterator, Dict, List, Optional, Set
+
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+
+# ==========================================================
+# 1️⃣  In-process pub/sub hub
+# ==========================================================
+SUBSCRIBER_QUEUE_SIZE = 256
+HEARTBEAT_SECONDS = 15.0
+
+
+def format_sse(message: Dict[str, Any]) -> str:
+    return f"event: {message['type']}\ndata: {json.dumps(message, separators=(',', ':'))}\n\n"
+
+
+RESYNC_FRAME = format_sse({"type": "resync"})
+
+
+class Subscriber:
+    """One connected client: a bounded queue of SSE frames plus a flag set when it fell behind."""
+
+    def __init__(self, hub: "EventHub", maxsize: int) -> None:
+        self.hub = hub
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=maxsize)
+        self.resync_pending = False
+
+    def offer(self, frame: str) -> None:
+        """Enqueue without blocking; a full queue is flushed and replaced by a single resync."""
+        if self.resync_pending:
+            return  # the client will refetch everything anyway
+        try:
+            self.queue.put_nowait(frame)
+        except asyncio.QueueFull:
+            while not self.queue.empty():
+                self.queue.get_nowait()
+            self.queue.put_nowait(RESYNC_FRAME)
+            self.resync_pending = True
+            self.hub.stats["resyncs"] += 1
+
+    async def next(self, timeout: float) -> Optional[str]:
+        """Next frame, or ``None`` if nothing arrived within ``timeout`` seconds."""
+        if not self.queue.empty():
+            frame = self.queue.get_nowait()  # skip wait_for's timer when frames are waiting
+        else:
+            try:
+                frame = await asyncio.wait_for(self.queue.get(), timeout)
+            except asyncio.TimeoutError:
+                return None
+        if frame is RESYNC_FRAME:
+            self.resync_pending = False
+        return frame
+
+
+class EventHub:
+    """Fans change events out to every subscriber on this worker's event loop.
+
+    ``publish`` is safe to call from the threadpool that runs sync handlers;
+    fan-out always happens on the loop thread, so queues are never touched
+    concurrently.
+    """
+
+    def __init__(self, queue_size: int = SUBSCRIBER_QUEUE_SIZE) -> None:
+        self.queue_size = queue_size
+        self._subscribers: Set[Subscriber] = set()
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._lock = threading.Lock()
+        self.stats = {"published": 0, "resyncs": 0}
+
+    @property
+    def subscriber_count(self) -> int:
+        return len(self._subscribers)
+
+    def subscribe(self) -> Subscriber:
+        """Register a subscriber; must be called from the event loop."""
+        self._loop = asyncio.get_running_loop()
+        subscriber = Subscriber(self, self.queue_size)
+        with self._lock:
+            self._subscribers.add(subscriber)
+        return subscriber
+
+    def unsubscribe(self, subscriber: Subscriber) -> None:
+        with self._lock:
+            self._subscribers.discard(subscriber)
+
+    def publish(self, message: Dict[str, Any]) -> None:
+        loop = self._loop
+        if loop is None or not self._subscribers or loop.is_closed():
+            return
+        self.stats["published"] += 1
+        frame = format_sse(message)  # encoded once, shared by every subscriber
+        try:
+            running = asyncio.get_running_loop()
+        except RuntimeError:
+            running = None
+        if running is loop:
+            self._fan_out(frame)
+        else:
+            loop.call_soon_threadsafe(self._fan_out, frame)
+
+    def _fan_out(self, frame: str) -> None:
+        with self._lock:
+            subscribers = list(self._subscribers)
+        for subscriber in subscribers:
+            subscriber.offer(frame)
+
+
+hub = EventHub()
+
+
+# ==========================================================
+# 2️⃣  Publish only what actually committed
+# ==========================================================
+def queue_event(session: Session, message: Dict[str, Any]) -> None:
+    """Hold ``message`` until ``session`` commits; dropped on rollback."""
+    session.info.setdefault("pending_events", []).append(message)
+
+
+@event.listens_for(Session, "after_commit")
+def _publish_pending(session: Session) -> None:
+    for message in session.info.pop("pending_events", []):
+        hub.publish(message)
+
+
+@event.listens_for(Session, "after_rollback")
+def _discard_pending(session: Session) -> None:
+    session.info.pop("pending_events", None)
+
+
+# ==========================================================
+# 3️⃣  Server-Sent Events framing
+# ==========================================================
+async def event_stream(request, versions: Dict[str, int], events_hub: EventHub = hub) -> AsyncIterator[str]:
+    """Yield an SSE stream: a hello with current versions, then changes and heartbeats."""
+    subscriber = events_hub.subscribe()
+    try:
+        yield "retry: 5000\n\n"
+        yield format_sse({"type": "hello", "versions": versions})
+        while not await request.is_disconnected():
+            frame = await subscriber.next(HEARTBEAT_SECONDS)
+            yield ": ping\n\n" if frame is None else frame
+    finally:
+        events_hub.unsubscribe(subscriber)
+
+
+def change_messages(versions: Dict[str, int], changed: Dict[str, List[int]], deleted: Dict[str, List[int]]):
+    """Compact change events, one per table and operation."""
+    for op, groups in (("upsert", changed), ("delete", deleted)):
+        for table, ids in groups.items():
+            if ids:
+                yield {"type": "change", "table": table, "op": op, "ids": ids, "version": versions[table]}
@@ -0,0 +1,100 @@
+from __future__ import annotations
+
+import csv
+import io
+from contextlib import aclosing
+from datetime import datetime
+from typing import AsyncIterator, List, Optional, Sequence
+
+import orjson
+from sqlalchemy import Select
+from sqlmodel import select
+
+from archive import whole_ledger
+from database import db_session
+from ledger import filter_transactions
+from models import Goal, Resident
+from serialization import JSON_OPTIONS
+
+# ==========================================================
+# 1️⃣  What an export contains
+# ==========================================================
+EXPORT_BATCH_SIZE = 1000
+EXPORT_MEDIA_TYPES = {"csv": "text/csv; charset=utf-8", "ndjson": "application/x-ndjson"}
+
+LEDGER_COLUMNS = ("id", "timestamp", "resident_id", "goal_id", "points", "override_points", "staff_name", "note")
+
+
+def export_statement(
+    *,
+    resident_id: Optional[int] = None,
+    goal_id: Optional[int] = None,
+    start: Optional[datetime] = None,
+    end: Optional[datetime] = None,
+) -> Select:
+    """The whole ledger (hot and archived rows) oldest first, with resident and goal names joined in.
+
+    Outer joins keep a transaction in the export even if its resident or
+    goal row is gone. Filters are applied to each side of the union.
+    """
+    filters = dict(resident_id=resident_id, goal_id=goal_id, start=start, end=end)
+    ledger = whole_ledger(
+        lambda model: filter_transactions(
+            select(*(getattr(model, name) for name in LEDGER_COLUMNS)), source=model, **filters
+        )
+    )
+    columns = ledger.c
+    return (
+        select(
+            columns.id,
+            columns.timestamp,
+            columns.resident_id,
+            Resident.first_name.label("resident_first_name"),
+            Resident.last_name.label("resident_last_name"),
+            columns.goal_id,
+            Goal.title.label("goal_title"),
+            columns.points,
+            columns.override_points,
+            columns.staff_name,
+            columns.note,
+        )
+        .select_from(ledger)
+        .outerjoin(Resident, Resident.id == columns.resident_id)
+        .outerjoin(Goal, Goal.id == columns.goal_id)
+        .order_by(columns.timestamp, columns.id)
+    )
+
+
+# ==========================================================
+# 2️⃣  Batch encoders
+# ==========================================================
+def _csv_chunk(rows: Sequence[Sequence]) -> bytes:
+    buffer = io.StringIO()
+    csv.writer(buffer).writerows(
+        [value.isoformat() if isinstance(value, datetime) else value for value in row] for row in rows
+    )
+    return buffer.getvalue().encode()
+
+
+def _ndjson_chunk(keys: List[str], rows: Sequence[Sequence]) -> bytes:
+    option = JSON_OPTIONS | orjson.OPT_APPEND_NEWLINE
+    return b"".join(orjson.dumps(dict(zip(keys, row)), option=option) for row in rows)
+
+
+# ==========================================================
+# 3️⃣  Streaming
+# ==========================================================
+async def export_chunks(fmt: str, batch_size: int = EXPORT_BATCH_SIZE, **filters) -> AsyncIterator[bytes]:
+    """Encoded export, one chunk per database batch.
+
+    Opens its own session because the response body is sent after the
+    request's dependencies have been torn down. Memory is bounded by
+    ``batch_size`` rows whatever the ledger size.
+    """
+    statement = export_statement(**filters)
+    keys = list(statement.selected_columns.keys())
+    if fmt == "csv":
+        yield _csv_chunk([keys])
+    async with db_session() as db, aclosing(db.stream(statement, batch_size)) as batches:
+        async for rows in batches:
+            yield _csv_chunk(rows) if fmt == "csv" else _ndjson_chunk(keys, rows)
@@ -0,0 +1,368 @@
+from __future__ import annotations
+
+import base64
+import binascii
+from datetime import datetime, timezone
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+from sqlalchemy import ColumnElement, Select, case, delete, insert, tuple_, update
+from sqlmodel import Session, select
+
+from models import (
+    Goal,
+    Resident,
+    ResidentBalanceSnapshot,
+    Transaction,
+    TransactionArchive,
+    TransactionBatchItemResult,
+    TransactionBatchResult,
+    utc_now,
+)
+from archive import goals_in_use
+from cache import read_cache
+from changes import record_changes
+from rollups import apply_transactions, forget_resident
+
+# ==========================================================
+# Keyset pagination over (timestamp, id)
+# ==========================================================
+MAX_PAGE_SIZE = 1000
+
+
+def encode_cursor(transaction: Transaction) -> str:
+    """Build an opaque cursor pointing just past ``transaction`` (an entity or a ``Row``)."""
+    raw = f"{transaction.timestamp.isoformat()}|{transaction.id}"
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str) -> Tuple[datetime, int]:
+    """Parse a cursor from :func:`encode_cursor`; raises ``ValueError`` if malformed."""
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        raw = base64.urlsafe_b64decode(padded.encode()).decode()
+        ts_part, id_part = raw.rsplit("|", 1)
+        return as_utc_naive(datetime.fromisoformat(ts_part)), int(id_part)
+    except (binascii.Error, UnicodeDecodeError, ValueError) as exc:
+        raise ValueError(f"Invalid cursor: {cursor!r}") from exc
+
+
+def as_utc_naive(value: datetime) -> datetime:
+    """Timestamps are stored as naive UTC; normalise aware datetimes to match."""
+    if value.tzinfo is not None:
+        value = value.astimezone(timezone.utc).replace(tzinfo=None)
+    return value
+
+
+def filter_transactions(
+    statement: Select,
+    *,
+    resident_id: Optional[int] = None,
+    goal_id: Optional[int] = None,
+    staff_name: Optional[str] = None,
+    start: Optional[datetime] = None,
+    end: Optional[datetime] = None,
+    source: Any = Transaction,
+) -> Select:
+    """Apply the list filters shared by paging and export; ``end`` is exclusive.
+
+    ``source`` is the model the filters apply to (``TransactionArchive`` for
+    the cold rows).
+    """
+    if resident_id is not None:
+        statement = statement.where(source.resident_id == resident_id)
+    if goal_id is not None:
+        statement = statement.where(source.goal_id == goal_id)
+    if staff_name is not None:
+        statement = statement.where(source.staff_name == staff_name)
+    if start is not None:
+        statement = statement.where(source.timestamp >= as_utc_naive(start))
+    if end is not None:
+        statement = statement.where(source.timestamp < as_utc_naive(end))
+    return statement
+
+
+def transaction_page(
+    session: Session,
+    *,
+    resident_id: Optional[int] = None,
+    goal_id: Optional[int] = None,
+    staff_name: Optional[str] = None,
+    start: Optional[datetime] = None,
+    end: Optional[datetime] = None,
+    cursor: Optional[str] = None,
+    limit: Optional[int] = None,
+    changed_since: Optional[int] = None,
+    columns: Optional[Sequence[ColumnElement]] = None,
+    base: Optional[Select] = None,
+) -> Tuple[Sequence[Any], Optional[str]]:
+    """Return one newest-first page of transactions and the cursor for the next page.
+
+    The next cursor is ``None`` when the page is the last one (or no limit was given).
+    With ``columns`` the page holds ``Row`` tuples of just those columns instead
+    of ``Transaction`` objects; include ``timestamp`` and ``id`` so the cursor
+    can be built. ``base`` replaces ``select(Transaction)`` outright, for
+    statements that need joins or loader options; the same rule applies.
+    """
+    if base is None:
+        base = select(*columns) if columns is not None else select(Transaction)
+    statement = filter_transactions(
+        base,
+        resident_id=resident_id,
+        goal_id=goal_id,
+        staff_name=staff_name,
+        start=start,
+        end=end,
+    )
+    if changed_since is not None:
+        statement = statement.where(Transaction.change_seq > changed_since)
+    if cursor is not None:
+        after_ts, after_id = decode_cursor(cursor)
+        statement = statement.where(
+            tuple_(Transaction.timestamp, Transaction.id) < tuple_(after_ts, after_id)
+        )
+
+    statement = statement.order_by(Transaction.timestamp.desc(), Transaction.id.desc())
+    if limit is None:
+        return session.exec(statement).all(), None
+
+    # Fetch one extra row to learn whether another page exists.
+    rows = session.exec(statement.limit(limit + 1)).all()
+    if len(rows) <= limit:
+        return rows, None
+    page = rows[:limit]
+    return page, encode_cursor(page[-1])
+
+
+# ==========================================================
+# Single-transaction writes
+# ==========================================================
+def increment_balance(session: Session, resident_id: int, delta: int) -> Optional[int]:
+    """Atomically add ``delta`` to a balance; returns the new balance, or ``None`` if no such resident.
+
+    The database applies the increment under its own row lock, so concurrent
+    writers never read-modify-write a stale balance.
+    """
+    return session.exec(
+        update(Resident)
+        .where(Resident.id == resident_id)
+        .values(token_balance=Resident.token_balance + delta, version=Resident.version + 1)
+        .returning(Resident.token_balance)
+        .execution_options(synchronize_session=False)
+    ).scalar_one_or_none()
+
+
+def _points_for(item: Transaction, goal_points: int) -> Tuple[int, bool]:
+    """Points to record and whether they override the goal's default.
+
+    Shared by single and batch creates so both store the same row; the
+    client's ``override_points`` and ``timestamp`` are not trusted.
+    """
+    if item.points is None:
+        return goal_points, False
+    return item.points, item.points != goal_points
+
+
+def record_transaction(session: Session, item: Transaction) -> Transaction:
+    """Insert one ledger row, move the balance and update rollups, then commit.
+
+    Raises ``LookupError`` (nothing written) if the resident or goal is missing.
+    """
+    goal = live_goal(session, item.goal_id, cached=True)
+    if goal is None:
+        raise LookupError("Goal not found")
+
+    points_value, override = _points_for(item, goal.points)
+    if increment_balance(session, item.resident_id, points_value) is None:
+        session.rollback()
+        raise LookupError("Resident not found")
+
+    # RETURNING hands back the stored row, so no refresh round trip after commit.
+    row = session.exec(
+        insert(Transaction)
+        .values(
+            resident_id=item.resident_id,
+            goal_id=item.goal_id,
+            staff_name=item.staff_name,
+            points=points_value,
+            note=item.note,
+            override_points=override,
+            timestamp=utc_now(),
+        )
+        .returning(*Transaction.__table__.c)
+    ).mappings().one()
+    db_transaction = Transaction.model_validate(row)
+    apply_transactions(session, [db_transaction])
+    versions = record_changes(
+        session, changed={"resident": [item.resident_id], "transaction": [db_transaction.id]}
+    )
+    db_transaction.change_seq = versions["transaction"]
+    session.commit()
+    return db_transaction
+
+
+# ==========================================================
+# Batch ingestion
+# ==========================================================
+MAX_BATCH_SIZE = 1000
+
+
+def adjust_balances(session: Session, deltas: Dict[int, int]) -> None:
+    """Apply per-resident balance deltas in a single UPDATE ... CASE statement."""
+    deltas = {rid: delta for rid, delta in deltas.items() if delta}
+    if not deltas:
+        return
+    session.exec(
+        update(Resident)
+        .where(Resident.id.in_(sorted(deltas)))
+        .values(
+            token_balance=Resident.token_balance + case(deltas, value=Resident.id, else_=0),
+            version=Resident.version + 1,
+        )
+        .execution_options(synchronize_session=False)
+    )
+
+
+def record_batch(session: Session, items: Sequence[Transaction]) -> TransactionBatchResult:
+    """Validate and insert ``items`` as one unit; nothing is written unless every item is valid.
+
+    Residents are resolved with one query and goals through the read cache (one
+    query for any not cached), the ledger rows go out as a single multi-row
+    INSERT, and balances move with one UPDATE.
+    """
+    resident_ids = {item.resident_id for item in items}
+    goal_ids = {item.goal_id for item in items}
+    known_residents = set(session.exec(select(Resident.id).where(Resident.id.in_(resident_ids))))
+    goal_points = {
+        gid: goal.points
+        for gid, goal in read_cache.get_many(session, "goal", goal_ids).items()
+        if goal.deleted_at is None
+    }
+
+    errors: List[Optional[str]] = []
+    for item in items:
+        if item.resident_id not in known_residents:
+            errors.append("Resident not found")
+        elif item.goal_id not in goal_points:
+            errors.append("Goal not found")
+        else:
+            errors.append(None)
+
+    if any(errors):
+        return TransactionBatchResult(
+            committed=False,
+            results=[
+                TransactionBatchItemResult(index=i, ok=error is None, error=error or None)
+                for i, error in enumerate(errors)
+            ],
+        )
+
+    # Server time for every row, as in record_transaction: a batch of N
+    # stores the same rows as N single creates.
+    now = utc_now()
+    values = []
+    for item in items:
+        points_value, override = _points_for(item, goal_points[item.goal_id])
+        values.append(
+            {
+                "resident_id": item.resident_id,
+                "goal_id": item.goal_id,
+                "staff_name": item.staff_name,
+                "points": points_value,
+                "note": item.note,
+                "override_points": override,
+                "timestamp": now,
+            }
+        )
+    # One multi-row INSERT ... RETURNING, rows handed back in parameter order.
+    rows = [
+        Transaction.model_validate(row)
+        for row in session.exec(
+            insert(Transaction).returning(*Transaction.__table__.c, sort_by_parameter_order=True),
+            params=values,
+        ).mappings()
+    ]
+
+    deltas: Dict[int, int] = {}
+    for row in rows:
+        deltas[row.resident_id] = deltas.get(row.resident_id, 0) + row.points
+    adjust_balances(session, deltas)
+    apply_transactions(session, rows)
+    versions = record_changes(
+        session, changed={"resident": sorted(deltas), "transaction": [row.id for row in rows]}
+    )
+    for row in rows:
+        row.change_seq = versions["transaction"]
+
+    results = [TransactionBatchItemResult(index=i, ok=True, transaction=row) for i, row in enumerate(rows)]
+    session.commit()
+    return TransactionBatchResult(committed=True, results=results)
+
+
+# ==========================================================
+# Deleting residents and goals (one statement per table)
+# ==========================================================
+def live_goal(session: Session, goal_id: int, cached: bool = False) -> Optional[Goal]:
+    """The goal, or ``None`` if it is missing or soft-deleted.
+
+    Every single-goal read goes through here, so a soft-deleted goal is gone
+    wherever a goal is addressed by id (matching its tombstone); only
+    transactions that reference it still show its title.
+    """
+    goal = read_cache.get(session, "goal", goal_id) if cached else session.get(Goal, goal_id)
+    if goal is None or goal.deleted_at is not None:
+        return None
+    return goal
+
+
+def remove_goals(session: Session, goal_ids: Sequence[int]) -> None:
+    """Delete goals no transaction references; soft-delete the rest.
+
+    Soft-deleted goals keep their row (and title) for the history that points
+    at them; ``archive.py purge`` removes them once nothing does. Does not
+    commit.
+    """
+    in_use = goals_in_use(session, goal_ids)
+    unused = [gid for gid in goal_ids if gid not in in_use]
+    if unused:
+        session.exec(delete(Goal).where(Goal.id.in_(unused)))
+    if in_use:
+        session.exec(
+            update(Goal)
+            .where(Goal.id.in_(sorted(in_use)))
+            .values(deleted_at=utc_now())
+            .execution_options(synchronize_session=False)
+        )
+
+
+def remove_resident(session: Session, resident_id: int) -> Dict[str, List[int]]:
+    """Delete a resident with their hot and archived transactions, rollups and own goals.
+
+    Set-based: a fixed handful of statements however long the history, with
+    nothing loaded into the session. Returns the deleted ids per table, ready
+    for ``record_changes(deleted=...)``; goals that were only soft-deleted are
+    included, since ``live_goal`` and the goal list no longer serve them.
+    Does not commit.
+    """
+    forget_resident(session, resident_id)
+    transaction_ids = list(
+        session.exec(
+            delete(Transaction).where(Transaction.resident_id == resident_id).returning(Transaction.id)
+        ).scalars()
+    )
+    session.exec(delete(TransactionArchive).where(TransactionArchive.resident_id == resident_id))
+    session.exec(delete(ResidentBalanceSnapshot).where(ResidentBalanceSnapshot.resident_id == resident_id))
+
+    # Their goals go too. Ones other residents earned tokens on are soft-deleted,
+    # and every goal drops the owner since the resident row is about to go.
+    goal_ids = list(
+        session.exec(select(Goal.id).where(Goal.resident_id == resident_id, Goal.deleted_at.is_(None)))
+    )
+    remove_goals(session, goal_ids)
+    session.exec(
+        update(Goal)
+        .where(Goal.resident_id == resident_id)
+        .values(resident_id=None)
+        .execution_options(synchronize_session=False)
+    )
+    session.exec(delete(Resident).where(Resident.id == resident_id))
+    return {"resident": [resident_id], "transaction": transaction_ids, "goal": goal_ids}
@@ -1,15 +1,59 @@
 ﻿from __future__ import annotations
 
+import logging
+import os
 from contextlib import asynccontextmanager
 from datetime import datetime, timezone
-from typing import List, Optional
+from typing import List, Literal, Optional
 
-from fastapi import Body, Depends, FastAPI, HTTPException, Path
+from fastapi import Body, Depends, FastAPI, HTTPException, Path, Query, Request, Response
+from fastapi.encoders import jsonable_encoder
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse, PlainTextResponse, StreamingResponse
+from sqlalchemy import update
 from sqlmodel import Session, select
 
-from database import get_session, init_db
-from models import Resident, Goal, Transaction
+# Before the local imports so engine setup messages are not lost.
+logging.basicConfig(level=os.getenv("LOG_LEVEL", "INFO").upper(), format="%(levelname)s %(name)s: %(message)s")
+
+from analytics import leaderboard, parse_window, timeseries
+from cache import read_cache
+from changes import (
+    SYNC_HEADERS,
+    ChangeLogExpired,
+    check_not_modified,
+    current_versions,
+    deleted_since,
+    ensure_counters,
+    record_changes,
+)
+from database import DB, db_session, get_db, init_db, pool_report
+from events import event_stream
+from export import EXPORT_MEDIA_TYPES, export_chunks
+from ledger import (
+    MAX_BATCH_SIZE,
+    MAX_PAGE_SIZE,
+    live_goal,
+    record_batch,
+    record_transaction,
+    remove_goals,
+    remove_resident,
+    transaction_page,
+)
+from metrics import MetricsMiddleware, render_metrics
+from models import (
+    Goal,
+    LeaderboardEntry,
+    Resident,
+    ResidentSummary,
+    TimeseriesPoint,
+    Transaction,
+    TransactionBatchResult,
+    TransactionView,
+)
+from rollups import resident_summaries
+from serialization import encode, encode_rows, json_response, table_columns
+from views import INCLUDES, VIEW_FIELDS, parse_names, transaction_view_page
 
 # ----------------------------------------
 # App + lifespan
@@ -17,6 +61,8 @@ from models import Resident, Goal, Transaction
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     init_db()  # Create tables on startup
+    async with db_session() as db:
+        await db.run(ensure_counters)
     yield
     # Optional cleanup logic here
 
@@ -36,163 +82,490 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Next-Cursor", "X-Profile-Id", *SYNC_HEADERS],
 )
+# Outermost, so latency includes the other middleware.
+app.add_middleware(MetricsMiddleware)
 
 # ----------------------------------------
 # Resident endpoints
 # ----------------------------------------
 @app.post("/resident/", response_model=Resident, summary="Create a new resident")
-def create_resident(resident: Resident, session: Session = Depends(get_session)):
-    session.add(resident)
-    session.commit()
-    session.refresh(resident)
-    return resident
+async def create_resident(resident: Resident, db: DB = Depends(get_db)):
+    # Server-owned fields are never taken from the request body; the balance
+    # starts at 0 and only moves through the ledger.
+    resident = Resident(**resident.dict(exclude={"id", "token_balance", "version", "change_seq"}))
+
+    def create(session: Session):
+        session.add(resident)
+        session.flush()
+        record_changes(session, changed={"resident": [resident.id]})
+        session.commit()
+        session.refresh(resident)
+        return resident
+
+    return await db.run(create)
 
 
 @app.get("/resident/", response_model=List[Resident], summary="List all residents")
-def list_residents(session: Session = Depends(get_session)):
-    return session.exec(select(Resident)).all()
+async def list_residents(
+    request: Request,
+    response: Response,
+    since: Optional[int] = Query(None, ge=0, description="X-Sync-Cursor from a previous response; returns only changes"),
+    db: DB = Depends(get_db),
+):
+    def query(session: Session):
+        not_modified = check_not_modified(request, response, session, "resident")
+        if not_modified:
+            return not_modified
+        if since is None:
+            return json_response(read_cache.all_json(session, "resident"), response)
+        _deleted_since(session, response, "resident", since)
+        rows = session.exec(select(*table_columns(Resident)).where(Resident.change_seq > since)).all()
+        return json_response(encode_rows(rows), response)
+
+    return await db.run(query)
+
+
+@app.get(
+    "/resident/summary",
+    response_model=List[ResidentSummary],
+    summary="Balances, recent points and latest transactions for every resident",
+)
+async def list_resident_summaries(
+    recent: int = Query(5, ge=0, le=50, description="How many recent transactions to include per resident"),
+    resident_id: Optional[int] = Query(None, description="Only summarise this resident"),
+    db: DB = Depends(get_db),
+):
+    return await db.run(resident_summaries, recent=recent, resident_id=resident_id)
 
 
-@app.put("/resident/{resident_id}", response_model=Resident, summary="Update a resident")
-def update_resident(
+@app.put(
+    "/resident/{resident_id}",
+    response_model=Resident,
+    summary="Update a resident",
+    responses={409: {"description": "Resident changed since the supplied version"}},
+)
+async def update_resident(
     resident_id: int,
     updated_data: Resident,
-    session: Session = Depends(get_session),
+    db: DB = Depends(get_db),
 ):
-    resident = session.get(Resident, resident_id)
-    if not resident:
-        raise HTTPException(status_code=404, detail="Resident not found")
-
     update_fields = updated_data.dict(exclude_unset=True)
-    for key, value in update_fields.items():
-        setattr(resident, key, value)
+    # As on create: the balance is the ledger's, never set directly.
+    for key in ("id", "token_balance", "change_seq"):
+        update_fields.pop(key, None)
+    expected_version = update_fields.pop("version", None)
+
+    def update_row(session: Session):
+        # Single conditional UPDATE: no read-modify-write window, and a stale
+        # version (when supplied) matches zero rows instead of clobbering newer data.
+        statement = update(Resident).where(Resident.id == resident_id)
+        if expected_version is not None:
+            statement = statement.where(Resident.version == expected_version)
+        statement = (
+            statement.values(**update_fields, version=Resident.version + 1)
+            .returning(Resident)
+            .execution_options(synchronize_session=False, populate_existing=True)
+        )
+        resident = session.exec(statement).scalar_one_or_none()
+        if resident is None:
+            session.rollback()
+            if session.get(Resident, resident_id) is None:
+                raise HTTPException(status_code=404, detail="Resident not found")
+            raise HTTPException(status_code=409, detail="Resident was modified by someone else; reload and retry")
+
+        record_changes(session, changed={"resident": [resident_id]})
+        session.commit()
+        session.refresh(resident)
+        return resident
 
-    session.add(resident)
-    session.commit()
-    session.refresh(resident)
-    return resident
+    return await db.run(update_row)
 
 
 @app.delete("/resident/{resident_id}", summary="Delete a resident")
-def delete_resident(
+async def delete_resident(
     resident_id: int = Path(..., description="ID of the resident to delete"),
-    session: Session = Depends(get_session),
+    db: DB = Depends(get_db),
 ):
-    resident = session.get(Resident, resident_id)
-    if not resident:
-        raise HTTPException(status_code=404, detail="Resident not found")
+    """Removes the resident's transactions (hot and archived), rollups and own
+    goals with one statement per table; goals others have used are soft-deleted."""
+
+    def delete(session: Session):
+        resident = session.get(Resident, resident_id)
+        if not resident:
+            raise HTTPException(status_code=404, detail="Resident not found")
+
+        record_changes(session, deleted=remove_resident(session, resident_id))
+        session.commit()
 
-    session.delete(resident)
-    session.commit()
+    await db.run(delete)
     return {"message": f"Resident with ID {resident_id} deleted successfully"}
 
 # ----------------------------------------
 # Goal endpoints
 # ----------------------------------------
 @app.post("/goal/", response_model=Goal, summary="Create a new goal")
-def create_goal(goal: Goal, session: Session = Depends(get_session)):
-    session.add(goal)
-    session.commit()
-    session.refresh(goal)
-    return goal
+async def create_goal(goal: Goal, db: DB = Depends(get_db)):
+    # Server-owned fields are never taken from the request body.
+    goal = Goal(**goal.dict(exclude={"id", "change_seq", "deleted_at"}))
+
+    def create(session: Session):
+        session.add(goal)
+        session.flush()
+        record_changes(session, changed={"goal": [goal.id]})
+        session.commit()
+        session.refresh(goal)
+        return goal
+
+    return await db.run(create)
 
 
 @app.get("/goal/", response_model=List[Goal], summary="List all goals")
-def list_goals(session: Session = Depends(get_session)):
-    return session.exec(select(Goal)).all()
+async def list_goals(
+    request: Request,
+    response: Response,
+    since: Optional[int] = Query(None, ge=0, description="X-Sync-Cursor from a previous response; returns only changes"),
+    db: DB = Depends(get_db),
+):
+    def query(session: Session):
+        not_modified = check_not_modified(request, response, session, "goal")
+        if not_modified:
+            return not_modified
+        if since is None:
+            return json_response(read_cache.all_json(session, "goal"), response)
+        _deleted_since(session, response, "goal", since)
+        rows = session.exec(
+            select(*table_columns(Goal)).where(Goal.change_seq > since, Goal.deleted_at.is_(None))
+        ).all()
+        return json_response(encode_rows(rows), response)
+
+    return await db.run(query)
 
 
 @app.put("/goal/{goal_id}", response_model=Goal, summary="Update a goal")
-def update_goal(goal_id: int, updated_data: Goal, session: Session = Depends(get_session)):
-    goal = session.get(Goal, goal_id)
-    if not goal:
-        raise HTTPException(status_code=404, detail="Goal not found")
+async def update_goal(goal_id: int, updated_data: Goal, db: DB = Depends(get_db)):
+    def update_row(session: Session):
+        goal = live_goal(session, goal_id)
+        if not goal:
+            raise HTTPException(status_code=404, detail="Goal not found")
 
-    update_fields = updated_data.dict(exclude_unset=True)
-    for key, value in update_fields.items():
-        setattr(goal, key, value)
+        update_fields = updated_data.dict(exclude_unset=True)
+        update_fields.pop("change_seq", None)
+        update_fields.pop("deleted_at", None)
+        for key, value in update_fields.items():
+            setattr(goal, key, value)
+
+        session.add(goal)
+        session.flush()
+        record_changes(session, changed={"goal": [goal_id]})
+        session.commit()
+        session.refresh(goal)
+        return goal
 
-    session.add(goal)
-    session.commit()
-    session.refresh(goal)
-    return goal
+    return await db.run(update_row)
 
 
 @app.delete("/goal/{goal_id}", summary="Delete a goal")
-def delete_goal(goal_id: int, session: Session = Depends(get_session)):
-    goal = session.get(Goal, goal_id)
-    if not goal:
-        raise HTTPException(status_code=404, detail="Goal not found")
+async def delete_goal(goal_id: int, db: DB = Depends(get_db)):
+    """A goal with transactions against it is soft-deleted: it leaves the goal
+    list but history keeps its title until ``archive.py purge`` can remove it."""
 
-    session.delete(goal)
-    session.commit()
+    def delete(session: Session):
+        goal = live_goal(session, goal_id)
+        if not goal:
+            raise HTTPException(status_code=404, detail="Goal not found")
+
+        remove_goals(session, [goal_id])
+        record_changes(session, deleted={"goal": [goal_id]})
+        session.commit()
+
+    await db.run(delete)
     return {"detail": "Goal deleted successfully"}
 
 # ----------------------------------------
 # Transaction endpoints
 # ----------------------------------------
 @app.post("/transaction/", response_model=Transaction, summary="Create a new transaction and update resident balance")
-def create_transaction(transaction: Transaction, session: Session = Depends(get_session)):
+async def create_transaction(transaction: Transaction, db: DB = Depends(get_db)):
     try:
-        # 1️⃣ Fetch the related Resident and Goal
-        resident = session.get(Resident, transaction.resident_id)
-        if not resident:
-            raise HTTPException(status_code=404, detail="Resident not found")
-
-        goal = session.get(Goal, transaction.goal_id)
-        if not goal:
-            raise HTTPException(status_code=404, detail="Goal not found")
-
-        # 2️⃣ Determine points value
-        # Use the goal’s default points if not provided in the transaction
-        points_value = transaction.points if transaction.points is not None else goal.points
-
-        # 3️⃣ Create a new Transaction record
-        db_transaction = Transaction(
-            resident_id=transaction.resident_id,
-            goal_id=transaction.goal_id,
-            staff_name=transaction.staff_name,  # ✅ include staff name
-            points=points_value,
-            note=getattr(transaction, "note", None)  # optional field
-        )
-
-        # 4️⃣ Update the resident’s token balance
-        resident.token_balance += points_value
-
-        # 5️⃣ Save both updates atomically
-        session.add_all([db_transaction, resident])
-        session.commit()
-
-        # 6️⃣ Refresh and return the transaction
-        session.refresh(db_transaction)
-        return db_transaction
-
+        # Goal lookup, atomic balance increment, ledger insert and rollups in one DB transaction
+        return await db.run(record_transaction, transaction)
+    except LookupError as e:
+        raise HTTPException(status_code=404, detail=str(e))
     except Exception as e:
-        # 🔒 Roll back any partial changes if an error occurs
-        session.rollback()
+        # 🔒 db.run has already rolled back any partial changes
         raise HTTPException(
             status_code=500,
             detail=f"Transaction failed and rolled back: {str(e)}"
         )
 
 
+@app.post(
+    "/transaction/batch",
+    response_model=TransactionBatchResult,
+    summary="Record many transactions atomically",
+    responses={422: {"model": TransactionBatchResult, "description": "Batch rejected; see per-item errors"}},
+)
+async def create_transaction_batch(
+    transactions: List[Transaction] = Body(..., min_length=1, max_length=MAX_BATCH_SIZE),
+    db: DB = Depends(get_db),
+):
+    try:
+        result = await db.run(record_batch, transactions)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Batch failed and rolled back: {str(e)}")
+
+    if not result.committed:
+        return JSONResponse(status_code=422, content=jsonable_encoder(result))
+    return result
+
+
+@app.get("/transaction/", response_model=List[Transaction], summary="List transactions, newest first")
+async def list_transactions(
+    request: Request,
+    response: Response,
+    resident_id: Optional[int] = Query(None, description="Only transactions for this resident"),
+    goal_id: Optional[int] = Query(None, description="Only transactions for this goal"),
+    staff_name: Optional[str] = Query(None, description="Only transactions recorded by this staff member"),
+    start: Optional[datetime] = Query(None, description="Only transactions at or after this time (UTC)"),
+    end: Optional[datetime] = Query(None, description="Only transactions before this time (UTC)"),
+    limit: Optional[int] = Query(None, ge=1, le=MAX_PAGE_SIZE, description="Page size; omit for the full history"),
+    cursor: Optional[str] = Query(None, description="Value of X-Next-Cursor from the previous page"),
+    since: Optional[int] = Query(None, ge=0, description="X-Sync-Cursor from a previous response; returns only changes"),
+    db: DB = Depends(get_db),
+):
+    return await db.run(
+        _transaction_page_response,
+        request,
+        response,
+        since=since,
+        resident_id=resident_id,
+        goal_id=goal_id,
+        staff_name=staff_name,
+        start=start,
+        end=end,
+        limit=limit,
+        cursor=cursor,
+    )
 
 
+@app.get(
+    "/transaction/resident/{resident_id}",
+    response_model=List[Transaction],
+    summary="List transactions for a specific resident",
+)
+async def transactions_for_resident(
+    resident_id: int,
+    request: Request,
+    response: Response,
+    goal_id: Optional[int] = Query(None, description="Only transactions for this goal"),
+    start: Optional[datetime] = Query(None, description="Only transactions at or after this time (UTC)"),
+    end: Optional[datetime] = Query(None, description="Only transactions before this time (UTC)"),
+    limit: Optional[int] = Query(None, ge=1, le=MAX_PAGE_SIZE, description="Page size; omit for the full history"),
+    cursor: Optional[str] = Query(None, description="Value of X-Next-Cursor from the previous page"),
+    since: Optional[int] = Query(None, ge=0, description="X-Sync-Cursor from a previous response; returns only changes"),
+    db: DB = Depends(get_db),
+):
+    return await db.run(
+        _transaction_page_response,
+        request,
+        response,
+        since=since,
+        resident_id=resident_id,
+        goal_id=goal_id,
+        start=start,
+        end=end,
+        limit=limit,
+        cursor=cursor,
+    )
 
 
-@app.get("/transaction/", response_model=List[Transaction], summary="List all transactions")
-def list_transactions(session: Session = Depends(get_session)):
-    return session.exec(select(Transaction)).all()
+@app.get(
+    "/transaction/export",
+    summary="Download the full transaction history as CSV or NDJSON",
+    response_class=StreamingResponse,
+    responses={200: {"content": {media_type: {} for media_type in EXPORT_MEDIA_TYPES.values()}}},
+)
+async def export_transactions(
+    fmt: Literal["csv", "ndjson"] = Query("csv", alias="format", description="csv or ndjson"),
+    resident_id: Optional[int] = Query(None, description="Only transactions for this resident"),
+    goal_id: Optional[int] = Query(None, description="Only transactions for this goal"),
+    start: Optional[datetime] = Query(None, description="Only transactions at or after this time (UTC)"),
+    end: Optional[datetime] = Query(None, description="Only transactions before this time (UTC)"),
+):
+    """Oldest first, with resident and goal names inline. Streams from a
+    server-side cursor in fixed-size batches, so the download starts with the
+    first batch and memory stays flat however long the ledger is."""
+    return StreamingResponse(
+        export_chunks(fmt, resident_id=resident_id, goal_id=goal_id, start=start, end=end),
+        media_type=EXPORT_MEDIA_TYPES[fmt],
+        headers={"Content-Disposition": f'attachment; filename="transactions.{fmt}"'},
+    )
 
 
 @app.get(
-    "/transaction/resident/{resident_id}",
-    response_model=List[Transaction],
-    summary="List transactions for a specific resident",
+    "/transaction/detailed",
+    response_model=List[TransactionView],
+    summary="List transactions with resident and goal names joined in",
+)
+async def list_transaction_views(
+    response: Response,
+    fields: Optional[str] = Query(
+        None, description=f"Comma-separated subset of: {', '.join(VIEW_FIELDS)}; omit for all"
+    ),
+    include: Optional[str] = Query(None, description="Comma-separated related records to nest: resident, goal"),
+    resident_id: Optional[int] = Query(None, description="Only transactions for this resident"),
+    goal_id: Optional[int] = Query(None, description="Only transactions for this goal"),
+    staff_name: Optional[str] = Query(None, description="Only transactions recorded by this staff member"),
+    start: Optional[datetime] = Query(None, description="Only transactions at or after this time (UTC)"),
+    end: Optional[datetime] = Query(None, description="Only transactions before this time (UTC)"),
+    limit: Optional[int] = Query(None, ge=1, le=MAX_PAGE_SIZE, description="Page size; omit for the full history"),
+    cursor: Optional[str] = Query(None, description="Value of X-Next-Cursor from the previous page"),
+    db: DB = Depends(get_db),
+):
+    """Newest first, one SQL statement per page whatever is asked for: names
+    come from outer joins and ``include`` uses joined eager loading."""
+
+    def page(session: Session):
+        try:
+            return transaction_view_page(
+                session,
+                fields=parse_names(fields, VIEW_FIELDS, "fields"),
+                include=parse_names(include, INCLUDES, "include"),
+                resident_id=resident_id,
+                goal_id=goal_id,
+                staff_name=staff_name,
+                start=start,
+                end=end,
+                limit=limit,
+                cursor=cursor,
+            )
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+
+    body, next_cursor = await db.run(page)
+    if next_cursor:
+        response.headers["X-Next-Cursor"] = next_cursor
+    return json_response(body, response)
+
+
+def _transaction_page_response(session: Session, request: Request, response: Response, since=None, **filters):
+    """Run a keyset page query and expose the next cursor as a response header.
+
+    Rows are read as column tuples and encoded directly; ``response_model``
+    on the routes only documents the shape.
+    """
+    not_modified = check_not_modified(request, response, session, "transaction")
+    if not_modified:
+        return not_modified
+    if since is not None:
+        _deleted_since(session, response, "transaction", since)
+    try:
+        rows, next_cursor = transaction_page(
+            session, changed_since=since, columns=table_columns(Transaction), **filters
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    if next_cursor:
+        response.headers["X-Next-Cursor"] = next_cursor
+    return json_response(encode_rows(rows), response)
+
+
+def _deleted_since(session: Session, response: Response, table: str, since: int) -> None:
+    try:
+        deleted_since(session, response, table, since)
+    except ChangeLogExpired as e:
+        raise HTTPException(status_code=410, detail=str(e))
+
+# ----------------------------------------
+# Analytics (served from daily_activity_rollup)
+# ----------------------------------------
+@app.get("/analytics/leaderboard", response_model=List[LeaderboardEntry], summary="Top residents, goals or staff")
+async def get_leaderboard(
+    window: str = Query("7d", description="Look-back window including today, e.g. 7d or 4w"),
+    by: Literal["resident", "goal", "staff"] = Query("resident", description="What to rank"),
+    rank_by: Literal["points", "transactions"] = Query("points", description="Rank by points or by count"),
+    limit: int = Query(10, ge=1, le=100),
+    db: DB = Depends(get_db),
+):
+    window_days = _window_days(window)
+    entries = await db.run(leaderboard, by=by, window_days=window_days, rank_by=rank_by, limit=limit)
+    return Response(content=encode(entries), media_type="application/json")
+
+
+@app.get(
+    "/analytics/timeseries",
+    response_model=List[TimeseriesPoint],
+    summary="Points and transaction counts per day or week",
 )
-def transactions_for_resident(resident_id: int, session: Session = Depends(get_session)):
-    return session.exec(select(Transaction).where(Transaction.resident_id == resident_id)).all()
+async def get_timeseries(
+    bucket: Literal["day", "week"] = Query("day"),
+    group_by: Optional[Literal["resident", "goal", "staff"]] = Query(None, description="One series per key"),
+    window: str = Query("30d", description="Look-back window including today, e.g. 30d or 12w"),
+    resident_id: Optional[int] = Query(None, description="Only this resident"),
+    goal_id: Optional[int] = Query(None, description="Only this goal"),
+    staff_name: Optional[str] = Query(None, description="Only this staff member"),
+    db: DB = Depends(get_db),
+):
+    window_days = _window_days(window)
+    points = await db.run(
+        timeseries,
+        bucket=bucket,
+        group_by=group_by,
+        window_days=window_days,
+        resident_id=resident_id,
+        goal_id=goal_id,
+        staff_name=staff_name,
+    )
+    return Response(content=encode(points), media_type="application/json")
+
+
+def _window_days(window: str) -> int:
+    try:
+        return parse_window(window)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+# ----------------------------------------
+# Live updates
+# ----------------------------------------
+@app.get("/events", summary="Stream change events (Server-Sent Events)")
+async def stream_events(request: Request, db: DB = Depends(get_db)):
+    """Emits ``hello`` with the current table versions, then ``change`` events
+    (table, op, ids, version) as writes commit. A ``resync`` event means this
+    client fell behind and should refetch its lists."""
+    # db.run hands the connection back before the (possibly hours-long) stream starts.
+    versions = await db.run(current_versions)
+    return StreamingResponse(
+        event_stream(request, versions),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+# ----------------------------------------
+# Internal
+# ----------------------------------------
+@app.get("/internal/pool", include_in_schema=False)
+def pool_telemetry():
+    """Engine settings plus checkout wait, connection churn and pre-ping failures
+    for this worker, for sizing the pool against the pooler's connection limit."""
+    return pool_report()
+
+
+@app.get("/internal/cache", include_in_schema=False)
+def cache_telemetry():
+    """Hit, miss, eviction and invalidation counters for this worker's read cache."""
+    return read_cache.snapshot()
+
+
+@app.get("/metrics", include_in_schema=False)
+def prometheus_metrics():
+    """Per-route latency, SQL statement count and DB time histograms plus pool
+    counters for this worker, in Prometheus text format."""
+    return PlainTextResponse(render_metrics(pool_report()["pools"]), media_type="text/plain; version=0.0.4")
+
 
 # ----------------------------------------
 # Health
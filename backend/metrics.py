@@ -0,0 +1,268 @@
+from __future__ import annotations
+
+import logging
+import os
+import threading
+import time
+from contextvars import ContextVar
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Set, Tuple
+
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+from profiler import SamplingProfiler, profiler_settings
+
+logger = logging.getLogger(__name__)
+
+# ==========================================================
+# 1️⃣  Prometheus-style counters and histograms
+# ==========================================================
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+QUERY_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50, 100)
+
+Labels = Tuple[Tuple[str, str], ...]
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _format_labels(labels: Labels, extra: Sequence[Tuple[str, str]] = ()) -> str:
+    pairs = [*labels, *extra]
+    return "{" + ",".join(f'{key}="{_escape(str(value))}"' for key, value in pairs) + "}" if pairs else ""
+
+
+def _format_value(value: float) -> str:
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Counter:
+    def __init__(self, name: str, help_text: str) -> None:
+        self.name, self.help = name, help_text
+        self._values: Dict[Labels, float] = {}
+        self._lock = threading.Lock()
+
+    def inc(self, labels: Labels, amount: float = 1) -> None:
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+    def render(self) -> List[str]:
+        with self._lock:
+            values = sorted(self._values.items())
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} counter"]
+        lines += [f"{self.name}{_format_labels(labels)} {_format_value(value)}" for labels, value in values]
+        return lines
+
+
+class Histogram:
+    def __init__(self, name: str, help_text: str, buckets: Sequence[float]) -> None:
+        self.name, self.help, self.buckets = name, help_text, tuple(buckets)
+        self._series: Dict[Labels, List[float]] = {}  # bucket counts..., +Inf count, sum
+        self._lock = threading.Lock()
+
+    def observe(self, labels: Labels, value: float) -> None:
+        with self._lock:
+            series = self._series.get(labels)
+            if series is None:
+                series = self._series[labels] = [0] * (len(self.buckets) + 1) + [0.0]
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series[i] += 1
+            series[-2] += 1
+            series[-1] += value
+
+    def render(self) -> List[str]:
+        with self._lock:
+            series = sorted((labels, list(values)) for labels, values in self._series.items())
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        for labels, values in series:
+            for bound, count in zip(self.buckets, values):
+                lines.append(f"{self.name}_bucket{_format_labels(labels, [('le', _format_value(bound))])} {count}")
+            lines.append(f"{self.name}_bucket{_format_labels(labels, [('le', '+Inf')])} {values[-2]}")
+            lines.append(f"{self.name}_count{_format_labels(labels)} {values[-2]}")
+            lines.append(f"{self.name}_sum{_format_labels(labels)} {_format_value(values[-1])}")
+        return lines
+
+
+REQUESTS = Counter("http_requests_total", "Requests handled, by route and status code.")
+REQUEST_SECONDS = Histogram(
+    "http_request_duration_seconds", "Time from receiving a request to the last body byte.", LATENCY_BUCKETS
+)
+REQUEST_QUERIES = Histogram("http_request_db_queries", "SQL statements executed per request.", QUERY_BUCKETS)
+REQUEST_DB_SECONDS = Histogram(
+    "http_request_db_seconds", "Time spent executing SQL statements per request.", LATENCY_BUCKETS
+)
+QUERY_THRESHOLD_EXCEEDED = Counter(
+    "http_request_query_threshold_exceeded_total", "Requests that ran more statements than the N+1 threshold."
+)
+UNTRACKED_QUERIES = Counter("db_queries_outside_request_total", "SQL statements run outside any HTTP request.")
+METRICS = (REQUESTS, REQUEST_SECONDS, REQUEST_QUERIES, REQUEST_DB_SECONDS, QUERY_THRESHOLD_EXCEEDED, UNTRACKED_QUERIES)
+
+
+# ==========================================================
+# 2️⃣  Per-request SQL accounting (engine event hooks)
+# ==========================================================
+class RequestStats:
+    """What one request did in the database; shared with threadpool hops through a ContextVar."""
+
+    __slots__ = ("queries", "db_seconds", "threads")
+
+    def __init__(self) -> None:
+        self.queries = 0
+        self.db_seconds = 0.0
+        self.threads: Set[int] = {threading.get_ident()}
+
+
+_current: ContextVar[Optional[RequestStats]] = ContextVar("request_stats", default=None)
+
+
+def current_request() -> Optional[RequestStats]:
+    return _current.get()
+
+
+def instrument_engine(engine: Engine, name: str) -> None:
+    """Count statements and time them against the request running them (if any)."""
+
+    @event.listens_for(engine, "before_cursor_execute")
+    def _start(conn, cursor, statement, parameters, context, executemany) -> None:
+        conn.info.setdefault("query_started", []).append(time.perf_counter())
+
+    @event.listens_for(engine, "after_cursor_execute")
+    def _finish(conn, cursor, statement, parameters, context, executemany) -> None:
+        elapsed = time.perf_counter() - conn.info["query_started"].pop()
+        stats = _current.get()
+        if stats is None:
+            UNTRACKED_QUERIES.inc((("engine", name),))
+            return
+        stats.queries += 1
+        stats.db_seconds += elapsed
+        stats.threads.add(threading.get_ident())
+
+    @event.listens_for(engine, "handle_error")
+    def _failed(context) -> None:
+        started = context.connection.info.get("query_started") if context.connection is not None else None
+        if started:
+            started.pop()
+
+
+# ==========================================================
+# 3️⃣  ASGI middleware
+# ==========================================================
+def _env_int(name: str, default: int) -> int:
+    raw = os.getenv(name, "").strip()
+    return int(raw) if raw else default
+
+
+class MetricsMiddleware:
+    """Records latency, statement count and DB time per route, and runs the opt-in profiler.
+
+    Plain ASGI rather than ``BaseHTTPMiddleware`` so streaming responses pass
+    straight through. Routes are labelled by their path template
+    (``/resident/{resident_id}``), never the raw path. Server-sent event
+    streams are counted but kept out of the latency histogram.
+    """
+
+    def __init__(self, app, query_threshold: Optional[int] = None) -> None:
+        self.app = app
+        self.query_threshold = (
+            query_threshold if query_threshold is not None else _env_int("METRICS_QUERY_THRESHOLD", 20)
+        )
+        self.profiler = profiler_settings()
+
+    async def __call__(self, scope, receive, send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        stats = RequestStats()
+        token = _current.set(stats)
+        started = time.perf_counter()
+        response: Dict[str, Any] = {"status": 500, "streaming": False}
+        profiler = SamplingProfiler.for_request(self.profiler, scope, stats)
+
+        async def send_wrapper(message) -> None:
+            if message["type"] == "http.response.start":
+                response["status"] = message["status"]
+                content_type = dict(message.get("headers", [])).get(b"content-type", b"")
+                response["streaming"] = content_type.startswith(b"text/event-stream")
+                if profiler is not None:
+                    message.setdefault("headers", []).append((b"x-profile-id", profiler.profile_id.encode()))
+            await send(message)
+
+        try:
+            if profiler is not None:
+                profiler.start()
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            _current.reset(token)
+            elapsed = time.perf_counter() - started
+            route = getattr(scope.get("route"), "path", None) or "unmatched"
+            if profiler is not None:
+                profiler.stop(route)
+            self._record(scope["method"], route, response, stats, elapsed)
+
+    def _record(self, method: str, route: str, response: Dict[str, Any], stats: RequestStats, elapsed: float) -> None:
+        labels = (("method", method), ("route", route))
+        REQUESTS.inc(labels + (("status", str(response["status"])),))
+        REQUEST_QUERIES.observe(labels, stats.queries)
+        REQUEST_DB_SECONDS.observe(labels, stats.db_seconds)
+        if not response["streaming"]:
+            REQUEST_SECONDS.observe(labels, elapsed)
+        if self.query_threshold and stats.queries > self.query_threshold:
+            QUERY_THRESHOLD_EXCEEDED.inc(labels)
+            logger.warning(
+                "%s %s ran %d SQL statements (threshold %d, %.1f ms in the database): possible N+1",
+                method,
+                route,
+                stats.queries,
+                self.query_threshold,
+                stats.db_seconds * 1000,
+            )
+
+
+# ==========================================================
+# 4️⃣  Exposition
+# ==========================================================
+POOL_GAUGES = {
+    "checked_out": ("db_pool_checked_out", "Connections currently checked out."),
+    "idle": ("db_pool_idle", "Connections idle in the pool."),
+    "size": ("db_pool_size", "Configured pool size."),
+}
+POOL_COUNTERS = (
+    "checkouts",
+    "checkout_timeouts",
+    "connections_opened",
+    "connections_closed",
+    "connections_recycled",
+    "connections_invalidated",
+    "pings",
+    "ping_failures",
+)
+
+
+def _pool_lines(pools: Dict[str, Dict[str, Any]]) -> Iterable[str]:
+    for key, (metric, help_text) in POOL_GAUGES.items():
+        present = [(name, status[key]) for name, status in pools.items() if key in status]
+        if present:
+            yield f"# HELP {metric} {help_text}"
+            yield f"# TYPE {metric} gauge"
+            yield from (f'{metric}{{pool="{name}"}} {value}' for name, value in present)
+    for key in POOL_COUNTERS:
+        metric = f"db_pool_{key}_total"
+        yield f"# HELP {metric} Pool {key.replace('_', ' ')} since start."
+        yield f"# TYPE {metric} counter"
+        yield from (f'{metric}{{pool="{name}"}} {status[key]}' for name, status in pools.items())
+    yield "# HELP db_pool_checkout_wait_seconds Mean wait for a pooled connection."
+    yield "# TYPE db_pool_checkout_wait_seconds gauge"
+    for name, status in pools.items():
+        yield f'db_pool_checkout_wait_seconds{{pool="{name}"}} {status["checkout_wait_ms"]["mean"] / 1000}'
+
+
+def render_metrics(pools: Optional[Dict[str, Dict[str, Any]]] = None) -> str:
+    """Prometheus text exposition (version 0.0.4) of everything this worker has recorded."""
+    lines: List[str] = []
+    for metric in METRICS:
+        lines += metric.render()
+    if pools:
+        lines += _pool_lines(pools)
+    return "\n".join(lines) + "\n"
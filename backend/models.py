@@ -1,8 +1,14 @@
 ﻿from __future__ import annotations
-from typing import Optional
+from typing import List, Optional
 from sqlmodel import SQLModel, Field, Relationship
-from sqlalchemy.orm import Mapped
-from datetime import datetime, timezone
+from sqlalchemy import Index
+from sqlalchemy.orm import relationship
+from datetime import date, datetime, timezone
+
+
+def utc_now() -> datetime:
+    """Current time as naive UTC: every timestamp column is TIMESTAMP WITHOUT TIME ZONE."""
+    return datetime.now(timezone.utc).replace(tzinfo=None)
 
 
 # ==========================================================
@@ -14,6 +20,22 @@ class Resident(SQLModel, table=True):
     last_name: str
     display_name: Optional[str] = None
     token_balance: int = 0
+    # Bumped on every write (including balance increments); send it back on
+    # PUT to reject edits made against a stale copy.
+    version: int = Field(default=0, sa_column_kwargs={"server_default": "0"})
+    change_seq: int = Field(default=0, index=True, sa_column_kwargs={"server_default": "0"})
+
+    # Relationships use explicit relationship() targets: SQLModel can't resolve
+    # the string annotations that ``from __future__ import annotations`` leaves.
+    # passive_deletes="all": deleting a resident never loads or rewrites its
+    # history row by row; ledger.remove_resident clears it with one statement
+    # per table instead.
+    goals: List["Goal"] = Relationship(
+        sa_relationship=relationship("Goal", back_populates="resident", passive_deletes="all")
+    )
+    transactions: List["Transaction"] = Relationship(
+        sa_relationship=relationship("Transaction", back_populates="resident", passive_deletes="all")
+    )
 
 
 # ==========================================================
@@ -26,36 +48,195 @@ class Goal(SQLModel, table=True):
     points: int
     active: bool = True
     resident_id: Optional[int] = Field(default=None, foreign_key="resident.id")
+    change_seq: int = Field(default=0, index=True, sa_column_kwargs={"server_default": "0"})
+    # Set when a goal that the ledger still references is deleted: it leaves
+    # the goal list but keeps its title for history, exports and analytics.
+    deleted_at: Optional[datetime] = None
+
+    resident: Optional["Resident"] = Relationship(sa_relationship=relationship("Resident", back_populates="goals"))
+    transactions: List["Transaction"] = Relationship(
+        sa_relationship=relationship("Transaction", back_populates="goal", passive_deletes="all")
+    )
 
 
 # ==========================================================
 # Transaction
 # ==========================================================
 class Transaction(SQLModel, table=True):
+    # Keyset pagination walks (timestamp, id) newest-first; each filterable
+    # column leads its own composite index so filtered pages stay index scans.
+    __table_args__ = (
+        Index("ix_transaction_timestamp_id", "timestamp", "id"),
+        Index("ix_transaction_resident_timestamp_id", "resident_id", "timestamp", "id"),
+        Index("ix_transaction_goal_timestamp_id", "goal_id", "timestamp", "id"),
+        Index("ix_transaction_staff_timestamp_id", "staff_name", "timestamp", "id"),
+    )
+
     id: Optional[int] = Field(default=None, primary_key=True)
     resident_id: int = Field(foreign_key="resident.id")
     goal_id: int = Field(foreign_key="goal.id")
     points: int
-    timestamp: datetime = Field(default_factory=lambda: datetime.now(timezone.utc), nullable=False)
+    timestamp: datetime = Field(default_factory=utc_now, nullable=False)
     staff_name: str
     note: Optional[str] = None
     override_points: bool = False
+    change_seq: int = Field(default=0, index=True, sa_column_kwargs={"server_default": "0"})
+
+    resident: Optional["Resident"] = Relationship(
+        sa_relationship=relationship("Resident", back_populates="transactions")
+    )
+    goal: Optional["Goal"] = Relationship(sa_relationship=relationship("Goal", back_populates="transactions"))
+
+
+# ==========================================================
+# Cold ledger (transactions moved out by archive.py)
+# ==========================================================
+class TransactionArchive(SQLModel, table=True):
+    __tablename__ = "transaction_archive"
+    __table_args__ = (
+        Index("ix_transaction_archive_timestamp_id", "timestamp", "id"),
+        Index("ix_transaction_archive_resident_timestamp_id", "resident_id", "timestamp", "id"),
+        Index("ix_transaction_archive_goal_timestamp_id", "goal_id", "timestamp", "id"),
+    )
+
+    # Same columns as Transaction, ids included, so the two can be UNIONed.
+    id: int = Field(primary_key=True, sa_column_kwargs={"autoincrement": False})
+    resident_id: int = Field(foreign_key="resident.id")
+    goal_id: int = Field(foreign_key="goal.id")
+    points: int
+    timestamp: datetime
+    staff_name: str
+    note: Optional[str] = None
+    override_points: bool = False
+    change_seq: int = 0
+    archived_at: datetime = Field(default_factory=utc_now)
+
+
+class ResidentBalanceSnapshot(SQLModel, table=True):
+    __tablename__ = "resident_balance_snapshot"
+
+    # Totals of the resident's archived transactions: the all-time figures are
+    # this row plus the hot rows, without reading the archive.
+    resident_id: int = Field(foreign_key="resident.id", primary_key=True)
+    points: int = 0
+    transaction_count: int = 0
+    archived_through: Optional[datetime] = None  # newest archived timestamp
+
+
+# ==========================================================
+# Change tracking (conditional GET + ?since= delta sync)
+# ==========================================================
+class TableVersion(SQLModel, table=True):
+    __tablename__ = "table_version"
+
+    table_name: str = Field(primary_key=True)
+    version: int = 0
+    updated_at: datetime = Field(default_factory=utc_now)
+    pruned_through: int = 0  # tombstones at or below this version have been discarded
+
+
+class Tombstone(SQLModel, table=True):
+    __table_args__ = (Index("ix_tombstone_table_seq", "table_name", "change_seq"),)
+
+    id: Optional[int] = Field(default=None, primary_key=True)
+    table_name: str
+    row_id: int
+    change_seq: int
+    deleted_at: datetime = Field(default_factory=utc_now)
+
+
+# ==========================================================
+# Resident rollups (maintained alongside every ledger write)
+# ==========================================================
+class ResidentRollup(SQLModel, table=True):
+    __tablename__ = "resident_rollup"
+
+    resident_id: int = Field(foreign_key="resident.id", primary_key=True)
+    points_total: int = 0
+    transaction_count: int = 0
+    last_transaction_at: Optional[datetime] = None
+
+
+class ResidentDailyRollup(SQLModel, table=True):
+    __tablename__ = "resident_daily_rollup"
+
+    resident_id: int = Field(foreign_key="resident.id", primary_key=True)
+    day: date = Field(primary_key=True)  # UTC calendar day
+    points: int = 0
+    transaction_count: int = 0
+
+
+class DailyActivityRollup(SQLModel, table=True):
+    __tablename__ = "daily_activity_rollup"
+
+    day: date = Field(primary_key=True)  # UTC calendar day; first so day ranges scan the primary key
+    resident_id: int = Field(foreign_key="resident.id", primary_key=True)
+    goal_id: int = Field(foreign_key="goal.id", primary_key=True)
+    staff_name: str = Field(primary_key=True)
+    points: int = 0
+    transaction_count: int = 0
 
 
 # ==========================================================
-# Relationships (declared after class definitions)
+# Read schemas
 # ==========================================================
-Resident.goals: Mapped[list[Goal]] = Relationship(  # type: ignore
-    back_populates="resident",
-    sa_relationship_kwargs={"cascade": "all, delete-orphan"},
-)
-Resident.transactions: Mapped[list[Transaction]] = Relationship(  # type: ignore
-    back_populates="resident",
-    sa_relationship_kwargs={"cascade": "all, delete-orphan"},
-)
+class ResidentSummary(SQLModel):
+    resident_id: int
+    first_name: str
+    last_name: str
+    display_name: Optional[str] = None
+    token_balance: int
+    points_today: int = 0
+    points_this_week: int = 0
+    points_all_time: int = 0
+    transaction_count: int = 0
+    last_transaction_at: Optional[datetime] = None
+    recent_transactions: List[Transaction] = []
+
+
+# A transaction with names joined in; ``?fields=`` leaves out unrequested keys.
+class TransactionView(SQLModel):
+    id: Optional[int] = None
+    resident_id: Optional[int] = None
+    resident_display_name: Optional[str] = None
+    goal_id: Optional[int] = None
+    goal_title: Optional[str] = None
+    points: Optional[int] = None
+    timestamp: Optional[datetime] = None
+    staff_name: Optional[str] = None
+    note: Optional[str] = None
+    override_points: Optional[bool] = None
+    change_seq: Optional[int] = None
+    resident: Optional[Resident] = None  # with ?include=resident
+    goal: Optional[Goal] = None  # with ?include=goal
+
+
+class LeaderboardEntry(SQLModel):
+    rank: int
+    resident_id: Optional[int] = None  # set when ranking residents
+    goal_id: Optional[int] = None  # set when ranking goals
+    staff_name: Optional[str] = None  # set when ranking staff
+    label: str
+    points: int
+    transaction_count: int
+
+
+class TimeseriesPoint(SQLModel):
+    bucket: date  # first day of the day/week bucket (weeks start on Monday)
+    resident_id: Optional[int] = None
+    goal_id: Optional[int] = None
+    staff_name: Optional[str] = None
+    points: int
+    transaction_count: int
+
+
+class TransactionBatchItemResult(SQLModel):
+    index: int
+    ok: bool
+    transaction: Optional[Transaction] = None
+    error: Optional[str] = None
 
-Goal.resident: Mapped[Resident] = Relationship(back_populates="goals")  # type: ignore
-Goal.transactions: Mapped[list[Transaction]] = Relationship(back_populates="goal")  # type: ignore
 
-Transaction.resident: Mapped[Resident] = Relationship(back_populates="transactions")  # type: ignore
-Transaction.goal: Mapped[Goal] = Relationship(back_populates="transactions")  # type: ignore
+class TransactionBatchResult(SQLModel):
+    committed: bool
+    results: List[TransactionBatchItemResult]
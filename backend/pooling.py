@@ -0,0 +1,190 @@
+from __future__ import annotations
+
+import logging
+import threading
+import time
+from collections import deque
+from typing import Any, Deque, Dict, Optional
+
+from sqlalchemy import event, exc
+from sqlalchemy.engine import Engine
+from sqlalchemy.pool import AsyncAdaptedQueuePool, Pool, QueuePool
+
+logger = logging.getLogger(__name__)
+
+# ==========================================================
+# 1️⃣  Counters shared by the sync and async pools
+# ==========================================================
+WAIT_SAMPLES = 2048
+PRE_PING_STRATEGIES = ("always", "idle", "off")
+
+
+class PoolStats:
+    """Thread-safe counters for one connection pool."""
+
+    def __init__(self, name: str) -> None:
+        self.name = name
+        self._lock = threading.Lock()
+        self._waits: Deque[float] = deque(maxlen=WAIT_SAMPLES)
+        self.counters = {
+            "checkouts": 0,
+            "checkout_timeouts": 0,
+            "connections_opened": 0,
+            "connections_closed": 0,
+            "connections_recycled": 0,
+            "connections_invalidated": 0,
+            "pings": 0,
+            "ping_failures": 0,
+        }
+        self.wait_total = 0.0
+        self.wait_max = 0.0
+
+    def incr(self, counter: str) -> None:
+        with self._lock:
+            self.counters[counter] += 1
+
+    def record_wait(self, seconds: float) -> None:
+        with self._lock:
+            self.counters["checkouts"] += 1
+            self.wait_total += seconds
+            self.wait_max = max(self.wait_max, seconds)
+            self._waits.append(seconds)
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._lock:
+            waits = sorted(self._waits)
+            counters = dict(self.counters)
+            total, worst = self.wait_total, self.wait_max
+
+        def pct(q: float) -> float:
+            return round(waits[min(len(waits) - 1, int(len(waits) * q))] * 1000, 3) if waits else 0.0
+
+        checkouts = counters["checkouts"]
+        return {
+            **counters,
+            "checkout_wait_ms": {
+                "mean": round(total / checkouts * 1000, 3) if checkouts else 0.0,
+                "p50": pct(0.50),
+                "p95": pct(0.95),
+                "p99": pct(0.99),
+                "max": round(worst * 1000, 3),
+                "samples": len(waits),
+            },
+        }
+
+
+registry: Dict[str, PoolStats] = {}
+
+
+# ==========================================================
+# 2️⃣  Pool classes that time how long a checkout waits
+# ==========================================================
+class _TimedGet:
+    """Times ``_do_get``: queueing for a free slot plus connecting when the pool grows."""
+
+    stats: Optional[PoolStats] = None
+
+    def _do_get(self):
+        started = time.perf_counter()
+        try:
+            record = super()._do_get()
+        except exc.TimeoutError:
+            if self.stats:
+                self.stats.incr("checkout_timeouts")
+            raise
+        if self.stats:
+            self.stats.record_wait(time.perf_counter() - started)
+        return record
+
+    def recreate(self):
+        pool = super().recreate()
+        pool.stats = self.stats
+        return pool
+
+
+class TimedQueuePool(_TimedGet, QueuePool):
+    pass
+
+
+class TimedAsyncQueuePool(_TimedGet, AsyncAdaptedQueuePool):
+    pass
+
+
+# ==========================================================
+# 3️⃣  Pool event listeners (lifecycle counters + pre-ping)
+# ==========================================================
+def instrument(engine: Engine, name: str, pre_ping: str = "always", ping_idle_seconds: float = 30.0) -> PoolStats:
+    """Attach telemetry and the configured pre-ping strategy to ``engine``'s pool.
+
+    ``always`` pings every reused connection on checkout (the old
+    ``pool_pre_ping=True``), ``idle`` only pings connections that sat in the
+    pool for ``ping_idle_seconds`` or longer, ``off`` never pings. A failed ping
+    raises ``DisconnectionError`` so the pool swaps in a fresh connection.
+    """
+    if pre_ping not in PRE_PING_STRATEGIES:
+        raise ValueError(f"pre-ping strategy must be one of {PRE_PING_STRATEGIES}, not {pre_ping!r}")
+    stats = registry[name] = PoolStats(name)
+    pool: Pool = engine.pool
+    if isinstance(pool, _TimedGet):
+        pool.stats = stats
+
+    @event.listens_for(pool, "connect")
+    def _on_connect(dbapi_connection, record) -> None:
+        stats.incr("connections_opened")
+        logger.debug("%s: opened connection #%d", name, stats.counters["connections_opened"])
+
+    @event.listens_for(pool, "close")
+    def _on_close(dbapi_connection, record) -> None:
+        stats.incr("connections_closed")
+        recycle = pool._recycle
+        if recycle > -1 and time.time() - record.starttime > recycle:
+            stats.incr("connections_recycled")
+
+    @event.listens_for(pool, "invalidate")
+    def _on_invalidate(dbapi_connection, record, exception) -> None:
+        stats.incr("connections_invalidated")
+        logger.warning("%s: connection invalidated: %r", name, exception)
+
+    @event.listens_for(pool, "checkin")
+    def _on_checkin(dbapi_connection, record) -> None:
+        if record is not None:
+            record.info["checked_in_at"] = time.monotonic()
+
+    if pre_ping != "off":
+
+        @event.listens_for(pool, "checkout")
+        def _ping(dbapi_connection, record, proxy) -> None:
+            last_used = record.info.get("checked_in_at")
+            if last_used is None:
+                return  # fresh connection; info is cleared on every reconnect
+            if pre_ping == "idle" and time.monotonic() - last_used < ping_idle_seconds:
+                return
+            stats.incr("pings")
+            try:
+                cursor = dbapi_connection.cursor()
+                try:
+                    cursor.execute("SELECT 1")
+                finally:
+                    cursor.close()
+            except Exception as e:
+                stats.incr("ping_failures")
+                raise exc.DisconnectionError(f"pre-ping failed: {e}") from e
+
+    return stats
+
+
+def pool_status(name: str, engine: Engine) -> Dict[str, Any]:
+    """Live occupancy of ``engine``'s pool plus the counters registered under ``name``."""
+    stats = registry[name]
+    pool = engine.pool
+    status: Dict[str, Any] = {"pool_class": type(pool).__name__}
+    if isinstance(pool, QueuePool):
+        status.update(
+            size=pool.size(),
+            checked_out=pool.checkedout(),
+            idle=pool.checkedin(),
+            overflow=max(pool.overflow(), 0),
+            max_overflow=pool._max_overflow,
+            timeout_seconds=pool.timeout(),
+        )
+    return {**status, **stats.snapshot()}
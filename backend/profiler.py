@@ -0,0 +1,123 @@
+from __future__ import annotations
+
+import itertools
+import logging
+import os
+import sys
+import threading
+import time
+from collections import Counter
+from dataclasses import dataclass
+from pathlib import Path
+from typing import TYPE_CHECKING, Optional
+
+if TYPE_CHECKING:
+    from metrics import RequestStats
+
+logger = logging.getLogger(__name__)
+
+# ==========================================================
+# 1️⃣  Settings
+# ==========================================================
+DEFAULT_PROFILE_DIR = Path(__file__).resolve().parent.parent / "logs" / "profiles"
+MAX_STACK_DEPTH = 128
+
+
+@dataclass(frozen=True)
+class ProfilerSettings:
+    """Opt-in per-request sampling profiler, read from the environment.
+
+    | Variable            | Default       | Meaning                                 |
+    | ------------------- | ------------- | --------------------------------------- |
+    | PROFILING_ENABLED   | false         | allow requests to ask for a profile     |
+    | PROFILE_INTERVAL_MS | 5             | time between stack samples              |
+    | PROFILE_DIR         | logs/profiles | where ``<id>.folded`` files are written |
+
+    When enabled, a request carrying ``X-Profile: 1`` (or ``?profile=1``) is
+    sampled; the response's ``X-Profile-Id`` names the file.
+    """
+
+    enabled: bool = False
+    interval: float = 0.005
+    directory: Path = DEFAULT_PROFILE_DIR
+
+
+def profiler_settings() -> ProfilerSettings:
+    return ProfilerSettings(
+        enabled=os.getenv("PROFILING_ENABLED", "false").strip().lower() in ("1", "true", "yes"),
+        interval=float(os.getenv("PROFILE_INTERVAL_MS", "5")) / 1000,
+        directory=Path(os.getenv("PROFILE_DIR", str(DEFAULT_PROFILE_DIR))),
+    )
+
+
+def _requested(scope) -> bool:
+    header = dict(scope.get("headers", [])).get(b"x-profile", b"").lower()
+    return header in (b"1", b"true", b"yes") or b"profile=1" in scope.get("query_string", b"").split(b"&")
+
+
+# ==========================================================
+# 2️⃣  Stack sampler
+# ==========================================================
+_ids = itertools.count(1)
+
+
+def _fold(frame, thread_name: str) -> str:
+    names = []
+    while frame is not None and len(names) < MAX_STACK_DEPTH:
+        code = frame.f_code
+        names.append(f"{code.co_name} ({Path(code.co_filename).name}:{frame.f_lineno})")
+        frame = frame.f_back
+    names.append(thread_name)
+    return ";".join(reversed(names))
+
+
+class SamplingProfiler:
+    """Samples the stacks of the threads serving one request from a background thread.
+
+    The threads are the event loop thread plus every threadpool worker that ran
+    SQL for the request (see ``RequestStats.threads``). The event loop is
+    shared, so under concurrent traffic its samples include other requests;
+    profile on a quiet instance for clean results. Output is the folded-stack
+    format read by flamegraph.pl and speedscope.
+    """
+
+    def __init__(self, settings: ProfilerSettings, stats: "RequestStats") -> None:
+        self.settings = settings
+        self.stats = stats
+        self.profile_id = f"{time.strftime('%Y%m%d-%H%M%S')}-{os.getpid()}-{next(_ids)}"
+        self.stacks: Counter = Counter()
+        self.samples = 0
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name=f"profiler-{self.profile_id}", daemon=True)
+
+    @classmethod
+    def for_request(cls, settings: ProfilerSettings, scope, stats: "RequestStats") -> Optional["SamplingProfiler"]:
+        if not settings.enabled or not _requested(scope):
+            return None
+        return cls(settings, stats)
+
+    def start(self) -> None:
+        self._thread.start()
+
+    def _run(self) -> None:
+        while not self._stop.wait(self.settings.interval):
+            frames = sys._current_frames()
+            names = {thread.ident: thread.name for thread in threading.enumerate()}
+            for ident in list(self.stats.threads):
+                frame = frames.get(ident)
+                if frame is not None:
+                    self.stacks[_fold(frame, names.get(ident, str(ident)))] += 1
+            self.samples += 1
+
+    def stop(self, route: str) -> Optional[Path]:
+        self._stop.set()
+        self._thread.join()
+        try:
+            self.settings.directory.mkdir(parents=True, exist_ok=True)
+            path = self.settings.directory / f"{self.profile_id}.folded"
+            path.write_text("".join(f"{stack} {count}\n" for stack, count in self.stacks.most_common()))
+        except OSError as e:
+            logger.warning("Could not write profile %s: %s", self.profile_id, e)
+            return None
+        logger.info("Profile %s for %s: %d samples -> %s", self.profile_id, route, self.samples, path)
+        return path
@@ -0,0 +1,383 @@
+from __future__ import annotations
+
+import argparse
+from collections import defaultdict
+from datetime import date, datetime, timedelta, timezone
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+
+from sqlalchemy import Date, case, cast, delete, func, insert, true
+from sqlalchemy.orm import aliased
+from sqlalchemy.sql import ColumnElement
+from sqlmodel import Session, select
+
+from archive import whole_ledger
+from models import (
+    DailyActivityRollup,
+    Resident,
+    ResidentBalanceSnapshot,
+    ResidentDailyRollup,
+    ResidentRollup,
+    ResidentSummary,
+    Transaction,
+)
+
+# ==========================================================
+# 1️⃣  Incremental maintenance (called inside the write transaction)
+# ==========================================================
+def apply_transactions(session: Session, transactions: Iterable[Transaction]) -> None:
+    """Fold new ledger rows into the rollup tables within the caller's DB transaction."""
+    totals: Dict[int, List] = {}
+    daily: Dict[Tuple[int, date], List[int]] = defaultdict(lambda: [0, 0])
+    activity: Dict[Tuple[date, int, int, str], List[int]] = defaultdict(lambda: [0, 0])
+    for tx in transactions:
+        entry = totals.setdefault(tx.resident_id, [0, 0, tx.timestamp])
+        entry[0] += tx.points
+        entry[1] += 1
+        entry[2] = max(entry[2], tx.timestamp)
+        day_entry = daily[(tx.resident_id, tx.timestamp.date())]
+        day_entry[0] += tx.points
+        day_entry[1] += 1
+        activity_entry = activity[(tx.timestamp.date(), tx.resident_id, tx.goal_id, tx.staff_name)]
+        activity_entry[0] += tx.points
+        activity_entry[1] += 1
+
+    if not totals:
+        return
+
+    # Sorted keys keep lock order stable across concurrent writers.
+    _upsert_add(
+        session,
+        ResidentRollup,
+        ["resident_id"],
+        [
+            {"resident_id": rid, "points_total": pts, "transaction_count": n, "last_transaction_at": last}
+            for rid, (pts, n, last) in sorted(totals.items())
+        ],
+        add=["points_total", "transaction_count"],
+        latest=["last_transaction_at"],
+    )
+    _upsert_add(
+        session,
+        ResidentDailyRollup,
+        ["resident_id", "day"],
+        [
+            {"resident_id": rid, "day": day, "points": pts, "transaction_count": n}
+            for (rid, day), (pts, n) in sorted(daily.items())
+        ],
+        add=["points", "transaction_count"],
+    )
+    _upsert_add(
+        session,
+        DailyActivityRollup,
+        ["day", "resident_id", "goal_id", "staff_name"],
+        [
+            {"day": day, "resident_id": rid, "goal_id": gid, "staff_name": staff, "points": pts, "transaction_count": n}
+            for (day, rid, gid, staff), (pts, n) in sorted(activity.items())
+        ],
+        add=["points", "transaction_count"],
+    )
+
+
+def forget_resident(session: Session, resident_id: int) -> None:
+    """Drop a resident's rollup rows (ahead of deleting the resident)."""
+    session.exec(delete(DailyActivityRollup).where(DailyActivityRollup.resident_id == resident_id))
+    session.exec(delete(ResidentDailyRollup).where(ResidentDailyRollup.resident_id == resident_id))
+    session.exec(delete(ResidentRollup).where(ResidentRollup.resident_id == resident_id))
+
+
+def _upsert_add(
+    session: Session,
+    model,
+    keys: Sequence[str],
+    rows: List[dict],
+    add: Sequence[str],
+    latest: Sequence[str] = (),
+) -> None:
+    """INSERT ... ON CONFLICT DO UPDATE that adds ``add`` columns and keeps the max of ``latest``."""
+    dialect = session.get_bind().dialect.name
+    if dialect == "postgresql":
+        from sqlalchemy.dialects.postgresql import insert as dialect_insert
+    elif dialect == "sqlite":
+        from sqlalchemy.dialects.sqlite import insert as dialect_insert
+    else:
+        raise NotImplementedError(f"Rollup upserts are not implemented for {dialect!r}")
+
+    table = model.__table__
+    stmt = dialect_insert(table).values(rows)
+    greatest = func.greatest if dialect == "postgresql" else func.max
+    updates = {name: table.c[name] + stmt.excluded[name] for name in add}
+    for name in latest:
+        updates[name] = greatest(func.coalesce(table.c[name], stmt.excluded[name]), stmt.excluded[name])
+    session.exec(stmt.on_conflict_do_update(index_elements=list(keys), set_=updates))
+
+
+# ==========================================================
+# 2️⃣  Summary reads (three queries regardless of resident count)
+# ==========================================================
+def resident_summaries(
+    session: Session,
+    recent: int = 5,
+    resident_id: Optional[int] = None,
+    now: Optional[datetime] = None,
+) -> List[ResidentSummary]:
+    """Balances, today/week/all-time points and the last ``recent`` transactions per resident."""
+    today = (now or datetime.now(timezone.utc)).date()
+    week_start = today - timedelta(days=today.weekday())  # Monday
+
+    resident_query = select(Resident, ResidentRollup).join(
+        ResidentRollup, ResidentRollup.resident_id == Resident.id, isouter=True
+    )
+    period_query = (
+        select(
+            ResidentDailyRollup.resident_id,
+            func.sum(case((ResidentDailyRollup.day == today, ResidentDailyRollup.points), else_=0)),
+            func.sum(ResidentDailyRollup.points),
+        )
+        .where(ResidentDailyRollup.day >= week_start)
+        .group_by(ResidentDailyRollup.resident_id)
+    )
+    if resident_id is not None:
+        resident_query = resident_query.where(Resident.id == resident_id)
+        period_query = period_query.where(ResidentDailyRollup.resident_id == resident_id)
+
+    periods = {rid: (today_pts, week_pts) for rid, today_pts, week_pts in session.exec(period_query)}
+    recent_by_resident = _recent_transactions(session, recent, resident_id)
+
+    summaries = []
+    for resident, rollup in session.exec(resident_query.order_by(Resident.id)):
+        today_pts, week_pts = periods.get(resident.id, (0, 0))
+        summaries.append(
+            ResidentSummary(
+                resident_id=resident.id,
+                first_name=resident.first_name,
+                last_name=resident.last_name,
+                display_name=resident.display_name,
+                token_balance=resident.token_balance,
+                points_today=today_pts or 0,
+                points_this_week=week_pts or 0,
+                points_all_time=rollup.points_total if rollup else 0,
+                transaction_count=rollup.transaction_count if rollup else 0,
+                last_transaction_at=rollup.last_transaction_at if rollup else None,
+                recent_transactions=recent_by_resident.get(resident.id, []),
+            )
+        )
+    return summaries
+
+
+def _recent_transactions(
+    session: Session, recent: int, resident_id: Optional[int]
+) -> Dict[int, List[Transaction]]:
+    """Top-``recent`` transactions per resident in one query.
+
+    Each resident probes the (resident_id, timestamp, id) index for its own
+    newest rows, so the cost is residents x ``recent`` rather than the ledger size.
+    """
+    if recent <= 0:
+        return {}
+    newest_first = (Transaction.timestamp.desc(), Transaction.id.desc())
+    residents = select(Resident.id)
+    if resident_id is not None:
+        residents = residents.where(Resident.id == resident_id)
+    residents = residents.subquery()
+
+    if session.get_bind().dialect.name == "postgresql":
+        latest = (
+            select(Transaction)
+            .where(Transaction.resident_id == residents.c.id)
+            .order_by(*newest_first)
+            .limit(recent)
+            .lateral("latest")
+        )
+        recent_tx = aliased(Transaction, latest)
+        statement = select(recent_tx).select_from(residents).join(latest, true())
+    else:
+        # No LATERAL in SQLite; a correlated IN (... LIMIT n) per resident plans the same way there.
+        newest_ids = (
+            select(Transaction.id)
+            .where(Transaction.resident_id == residents.c.id)
+            .order_by(*newest_first)
+            .limit(recent)
+            .correlate(residents)
+            .scalar_subquery()
+        )
+        recent_tx = Transaction
+        statement = select(Transaction).select_from(residents).join(Transaction, Transaction.id.in_(newest_ids))
+
+    grouped: Dict[int, List[Transaction]] = defaultdict(list)
+    for tx in session.exec(statement.order_by(recent_tx.resident_id, recent_tx.timestamp.desc(), recent_tx.id.desc())):
+        grouped[tx.resident_id].append(tx)
+    return grouped
+
+
+# ==========================================================
+# 3️⃣  Reconciliation against the raw ledger
+# ==========================================================
+def _day_of(column, dialect: str) -> ColumnElement:
+    # SQLite has no DATE type; date() yields the same 'YYYY-MM-DD' text the Date column stores.
+    return func.date(column) if dialect == "sqlite" else cast(column, Date)
+
+
+def reconcile(session: Session, days: int = 7, repair: bool = False) -> List[dict]:
+    """Compare rollups with the ledger; optionally rebuild the residents that drifted.
+
+    All-time totals are checked for every resident; daily rows only for the last
+    ``days`` days, which keeps the routine check to two grouped scans. Archived
+    transactions count through their balance snapshots, so the archive itself
+    is only read for recent days.
+    """
+    dialect = session.get_bind().dialect.name
+    problems: List[dict] = []
+
+    ledger_totals = {
+        snapshot.resident_id: (snapshot.points, snapshot.transaction_count)
+        for snapshot in session.exec(select(ResidentBalanceSnapshot))
+    }
+    for rid, pts, n in session.exec(
+        select(Transaction.resident_id, func.sum(Transaction.points), func.count()).group_by(Transaction.resident_id)
+    ):
+        archived_pts, archived_n = ledger_totals.get(rid, (0, 0))
+        ledger_totals[rid] = (archived_pts + (pts or 0), archived_n + n)
+    rollup_totals = {
+        r.resident_id: (r.points_total, r.transaction_count) for r in session.exec(select(ResidentRollup))
+    }
+    for rid in sorted(set(ledger_totals) | set(rollup_totals)):
+        expected, actual = ledger_totals.get(rid, (0, 0)), rollup_totals.get(rid, (0, 0))
+        if expected != actual:
+            problems.append({"resident_id": rid, "scope": "total", "ledger": expected, "rollup": actual})
+
+    since = datetime.now(timezone.utc).date() - timedelta(days=days)
+    ledger = whole_ledger(
+        lambda model: select(model.resident_id, model.points, model.timestamp).where(
+            model.timestamp >= datetime.combine(since, datetime.min.time())
+        )
+    )
+    day = _day_of(ledger.c.timestamp, dialect)
+    ledger_daily = {
+        (rid, d if isinstance(d, date) else date.fromisoformat(d)): (pts or 0, n)
+        for rid, d, pts, n in session.exec(
+            select(ledger.c.resident_id, day, func.sum(ledger.c.points), func.count()).group_by(
+                ledger.c.resident_id, day
+            )
+        )
+    }
+    rollup_daily = {
+        (r.resident_id, r.day): (r.points, r.transaction_count)
+        for r in session.exec(select(ResidentDailyRollup).where(ResidentDailyRollup.day >= since))
+    }
+    for key in sorted(set(ledger_daily) | set(rollup_daily)):
+        expected, actual = ledger_daily.get(key, (0, 0)), rollup_daily.get(key, (0, 0))
+        if expected != actual:
+            problems.append(
+                {"resident_id": key[0], "scope": key[1].isoformat(), "ledger": expected, "rollup": actual}
+            )
+
+    if repair and problems:
+        rebuild(session, sorted({p["resident_id"] for p in problems}))
+    return problems
+
+
+def rebuild(session: Session, resident_ids: Optional[Sequence[int]] = None) -> None:
+    """Recompute rollups from the ledger (hot and archived) for ``resident_ids`` (or everyone) and commit."""
+    dialect = session.get_bind().dialect.name
+
+    def rows(model):
+        statement = select(model.resident_id, model.points, model.timestamp)
+        return statement if resident_ids is None else statement.where(model.resident_id.in_(resident_ids))
+
+    ledger = whole_ledger(rows)
+    day = _day_of(ledger.c.timestamp, dialect)
+
+    clear_totals, clear_daily = delete(ResidentRollup), delete(ResidentDailyRollup)
+    totals = select(
+        ledger.c.resident_id,
+        func.sum(ledger.c.points),
+        func.count(),
+        func.max(ledger.c.timestamp),
+    )
+    daily = select(ledger.c.resident_id, day, func.sum(ledger.c.points), func.count())
+    if resident_ids is not None:
+        clear_totals = clear_totals.where(ResidentRollup.resident_id.in_(resident_ids))
+        clear_daily = clear_daily.where(ResidentDailyRollup.resident_id.in_(resident_ids))
+
+    _refill_activity(session, resident_ids=resident_ids)
+    session.exec(clear_daily)
+    session.exec(clear_totals)
+    session.exec(
+        insert(ResidentRollup).from_select(
+            ["resident_id", "points_total", "transaction_count", "last_transaction_at"],
+            totals.group_by(ledger.c.resident_id),
+        )
+    )
+    session.exec(
+        insert(ResidentDailyRollup).from_select(
+            ["resident_id", "day", "points", "transaction_count"],
+            daily.group_by(ledger.c.resident_id, day),
+        )
+    )
+    session.commit()
+
+
+def backfill_activity(session: Session, since: Optional[date] = None) -> int:
+    """Rebuild ``daily_activity_rollup`` from the ledger (from ``since`` on, or all of it) and commit.
+
+    Returns the number of aggregate rows written.
+    """
+    written = _refill_activity(session, since=since)
+    session.commit()
+    return written
+
+
+def _refill_activity(
+    session: Session, resident_ids: Optional[Sequence[int]] = None, since: Optional[date] = None
+) -> int:
+    def rows(model):
+        statement = select(model.timestamp, model.resident_id, model.goal_id, model.staff_name, model.points)
+        if resident_ids is not None:
+            statement = statement.where(model.resident_id.in_(resident_ids))
+        if since is not None:
+            statement = statement.where(model.timestamp >= datetime.combine(since, datetime.min.time()))
+        return statement
+
+    ledger = whole_ledger(rows)
+    day = _day_of(ledger.c.timestamp, session.get_bind().dialect.name)
+    keys = (day, ledger.c.resident_id, ledger.c.goal_id, ledger.c.staff_name)
+    clear = delete(DailyActivityRollup)
+    if resident_ids is not None:
+        clear = clear.where(DailyActivityRollup.resident_id.in_(resident_ids))
+    if since is not None:
+        clear = clear.where(DailyActivityRollup.day >= since)
+
+    session.exec(clear)
+    result = session.exec(
+        insert(DailyActivityRollup).from_select(
+            ["day", "resident_id", "goal_id", "staff_name", "points", "transaction_count"],
+            select(*keys, func.sum(ledger.c.points), func.count()).group_by(*keys),
+        )
+    )
+    return result.rowcount
+
+
+if __name__ == "__main__":
+    from database import engine
+
+    parser = argparse.ArgumentParser(description="Check resident rollups against the transaction ledger.")
+    parser.add_argument("command", choices=["reconcile", "rebuild", "backfill"])
+    parser.add_argument("--days", type=int, default=7, help="how many recent days of daily rollups to check")
+    parser.add_argument("--repair", action="store_true", help="rebuild residents whose rollups drifted")
+    parser.add_argument(
+        "--since", type=date.fromisoformat, help="backfill: only rebuild analytics days from YYYY-MM-DD on"
+    )
+    args = parser.parse_args()
+
+    with Session(engine) as session:
+        if args.command == "rebuild":
+            rebuild(session)
+            print("Rollups rebuilt from the ledger.")
+        elif args.command == "backfill":
+            written = backfill_activity(session, since=args.since)
+            print(f"Analytics rollup rebuilt from the ledger: {written} day/resident/goal/staff row(s).")
+        else:
+            problems = reconcile(session, days=args.days, repair=args.repair)
+            for problem in problems:
+                print(problem)
+            print(f"{len(problems)} mismatch(es){' repaired' if args.repair and problems else ''}.")
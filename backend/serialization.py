@@ -0,0 +1,56 @@
+from __future__ import annotations
+
+from typing import Any, List, Sequence
+
+import orjson
+from fastapi import Response
+from sqlalchemy import Column
+from sqlmodel import SQLModel
+
+# ==========================================================
+# 1️⃣  Column-only reads
+# ==========================================================
+def table_columns(model: type[SQLModel]) -> List[Column]:
+    """Every column of ``model``'s table, for ``select(*table_columns(Model))``.
+
+    Selecting columns instead of the entity returns plain ``Row`` tuples:
+    no identity map, no instance state, nothing to expire on commit.
+    """
+    return list(model.__table__.c)
+
+
+# ==========================================================
+# 2️⃣  Encoding
+# ==========================================================
+# OPT_UTC_Z writes aware UTC datetimes as "...Z", the same as Pydantic.
+JSON_OPTIONS = orjson.OPT_UTC_Z
+
+
+def encode_rows(rows: Sequence[Any]) -> bytes:
+    """JSON array of objects keyed by column name, straight from database rows.
+
+    The rows are trusted database output, so they skip the per-row
+    ``response_model`` validation FastAPI would otherwise run; the JSON is
+    byte-for-byte what the ORM path produces for the same columns.
+    """
+    if not rows:
+        return b"[]"
+    keys = rows[0]._fields
+    return orjson.dumps([dict(zip(keys, row)) for row in rows], option=JSON_OPTIONS)
+
+
+def encode(content: Any) -> bytes:
+    """JSON for plain dicts/lists built from trusted data (dates and datetimes included)."""
+    return orjson.dumps(content, option=JSON_OPTIONS)
+
+
+def json_response(body: bytes, response: Response) -> Response:
+    """Send pre-encoded ``body``, keeping the headers already set on the injected ``response``.
+
+    FastAPI only copies those headers onto responses it builds itself, and
+    skips ``response_model`` entirely for a returned ``Response``; the route's
+    declared model still drives the OpenAPI schema.
+    """
+    fast = Response(content=body, media_type="application/json")
+    fast.raw_headers.extend(response.raw_headers)
+    return fast
@@ -0,0 +1,110 @@
+from __future__ import annotations
+
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Tuple
+
+import orjson
+from sqlalchemy import func
+from sqlalchemy.orm import contains_eager
+from sqlmodel import Session, select
+
+from ledger import transaction_page
+from models import Goal, Resident, Transaction
+from serialization import JSON_OPTIONS, table_columns
+
+# ==========================================================
+# 1️⃣  What a transaction view can contain
+# ==========================================================
+VIEW_COLUMNS = {
+    **{column.key: column for column in table_columns(Transaction)},
+    # Display name, else "First Last" (an empty display name counts as unset).
+    "resident_display_name": func.coalesce(
+        func.nullif(Resident.display_name, ""), Resident.first_name + " " + Resident.last_name
+    ).label("resident_display_name"),
+    "goal_title": Goal.title.label("goal_title"),
+}
+VIEW_FIELDS = list(VIEW_COLUMNS)
+INCLUDES = {"resident": Transaction.resident, "goal": Transaction.goal}
+
+
+def parse_names(raw: Optional[str], allowed: Iterable[str], what: str) -> List[str]:
+    """Split a ``?fields=a,b`` style parameter; raises ``ValueError`` on unknown names."""
+    if not raw:
+        return []
+    names = list(dict.fromkeys(name.strip() for name in raw.split(",") if name.strip()))
+    unknown = [name for name in names if name not in allowed]
+    if unknown:
+        raise ValueError(f"Unknown {what}: {', '.join(unknown)} (choose from {', '.join(allowed)})")
+    return names
+
+
+# ==========================================================
+# 2️⃣  One query per page
+# ==========================================================
+def transaction_view_page(
+    session: Session,
+    *,
+    fields: Sequence[str] = (),
+    include: Sequence[str] = (),
+    **filters: Any,
+) -> Tuple[bytes, Optional[str]]:
+    """Encoded page of transactions with names joined in, plus the next cursor.
+
+    Without ``include`` only the requested columns are selected and the rows
+    are encoded straight from the result. ``include`` loads the related
+    ``Resident``/``Goal`` with joined eager loading: the same single query,
+    never a lazy load per row. ``filters`` are those of ``transaction_page``.
+    """
+    fields = list(fields) or VIEW_FIELDS
+    need_resident = "resident" in include or "resident_display_name" in fields
+    need_goal = "goal" in include or "goal_title" in fields
+
+    if include:
+        base = select(Transaction)
+    else:
+        # timestamp and id ride along for the cursor even when not requested.
+        extra = [name for name in ("timestamp", "id") if name not in fields]
+        base = select(*(VIEW_COLUMNS[name] for name in fields + extra)).select_from(Transaction)
+    if need_resident:
+        base = base.outerjoin(Resident, Resident.id == Transaction.resident_id)
+    if need_goal:
+        base = base.outerjoin(Goal, Goal.id == Transaction.goal_id)
+    if include:
+        if need_resident:
+            base = base.options(contains_eager(Transaction.resident))
+        if need_goal:
+            base = base.options(contains_eager(Transaction.goal))
+
+    rows, next_cursor = transaction_page(session, base=base, **filters)
+    if include:
+        items = [_entity_view(tx, fields, include) for tx in rows]
+    else:
+        items = [dict(zip(fields, row)) for row in rows]
+    return orjson.dumps(items, option=JSON_OPTIONS), next_cursor
+
+
+def _columns_of(entity) -> Optional[Dict[str, Any]]:
+    if entity is None:
+        return None
+    return {column.key: getattr(entity, column.key) for column in table_columns(type(entity))}
+
+
+def _display_name(resident: Optional[Resident]) -> Optional[str]:
+    if resident is None:
+        return None
+    if resident.display_name:
+        return resident.display_name
+    return f"{resident.first_name} {resident.last_name}"
+
+
+def _entity_view(tx: Transaction, fields: Sequence[str], include: Sequence[str]) -> Dict[str, Any]:
+    item: Dict[str, Any] = {}
+    for name in fields:
+        if name == "resident_display_name":
+            item[name] = _display_name(tx.resident)
+        elif name == "goal_title":
+            item[name] = tx.goal.title if tx.goal is not None else None
+        else:
+            item[name] = getattr(tx, name)
+    for relation in include:
+        item[relation] = _columns_of(getattr(tx, relation))
+    return item
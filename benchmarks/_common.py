@@ -0,0 +1,182 @@
+"""
+Shared helpers for the benchmark scripts.
+
+Benchmarks run against a local SQLite stand-in so they never touch the live
+Supabase database. Run them from the repository root, e.g.:
+
+    python benchmarks/bench_api.py --scale medium --mix burst
+    python benchmarks/bench_transaction_pages.py --scales 10000 100000
+
+bench_api.py is the end-to-end suite (real app, frontend-shaped traffic,
+JSON results per revision); the others isolate one component.
+"""
+
+from __future__ import annotations
+
+import os
+import random
+import statistics
+import subprocess
+import sys
+import time
+from contextlib import contextmanager
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+from typing import Callable, Dict, Iterator, List, Optional
+
+import httpx
+
+BENCH_DIR = Path(__file__).resolve().parent
+BACKEND_DIR = BENCH_DIR.parent / "backend"
+if str(BACKEND_DIR) not in sys.path:
+    sys.path.insert(0, str(BACKEND_DIR))
+
+from sqlalchemy import insert  # noqa: E402
+from sqlalchemy.engine import Engine, make_url  # noqa: E402
+from sqlmodel import SQLModel, Session, create_engine  # noqa: E402
+
+from models import Goal, Resident, Transaction  # noqa: E402
+
+STAFF = ["Alex", "Blair", "Casey", "Devon", "Emery", "Frankie"]
+
+
+def sqlite_engine(path: Path) -> Engine:
+    """Create a fresh SQLite database file with every table and index."""
+    if path.exists():
+        path.unlink()
+    engine = create_engine(f"sqlite:///{path}", connect_args={"check_same_thread": False})
+    with engine.connect() as conn:
+        # Persistent per file: readers stop queueing behind writers, closer to PostgreSQL's MVCC.
+        conn.exec_driver_sql("PRAGMA journal_mode=WAL")
+    SQLModel.metadata.create_all(engine)
+    return engine
+
+
+def scratch_engine(url: str) -> Engine:
+    """Drop and recreate every table in the (scratch!) PostgreSQL database at ``url``."""
+    parsed = make_url(url)
+    if "+" not in parsed.drivername:
+        parsed = parsed.set(drivername="postgresql+pg8000")
+    engine = create_engine(parsed)
+    SQLModel.metadata.drop_all(engine)
+    SQLModel.metadata.create_all(engine)
+    return engine
+
+
+def seed(engine: Engine, residents: int, goals: int, transactions: int, seed_value: int = 42) -> None:
+    """Insert synthetic residents, goals and a ledger spread over the last year."""
+    rng = random.Random(seed_value)
+    with Session(engine) as session:
+        session.execute(
+            insert(Resident),
+            [
+                {"first_name": f"First{i}", "last_name": f"Last{i}", "display_name": f"Resident {i}", "token_balance": 0}
+                for i in range(1, residents + 1)
+            ],
+        )
+        session.execute(
+            insert(Goal),
+            [
+                {"title": f"Goal {i}", "description": f"Synthetic goal {i}", "points": rng.randint(1, 10), "active": True}
+                for i in range(1, goals + 1)
+            ],
+        )
+        start = datetime.now(timezone.utc).replace(tzinfo=None) - timedelta(days=365)
+        step = timedelta(days=365) / max(transactions, 1)
+        chunk: List[Dict] = []
+        for i in range(transactions):
+            chunk.append(
+                {
+                    "resident_id": rng.randint(1, residents),
+                    "goal_id": rng.randint(1, goals),
+                    "points": rng.randint(-5, 10),
+                    "timestamp": start + step * i,
+                    "staff_name": rng.choice(STAFF),
+                    "note": None,
+                    "override_points": False,
+                }
+            )
+            if len(chunk) == 50_000:
+                session.execute(insert(Transaction), chunk)
+                chunk = []
+        if chunk:
+            session.execute(insert(Transaction), chunk)
+        session.commit()
+
+
+def time_call(fn: Callable[[], object], repeat: int) -> Dict[str, float]:
+    """Run ``fn`` ``repeat`` times and summarise the latencies in milliseconds."""
+    samples = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - started) * 1000)
+    samples.sort()
+    return {
+        "p50_ms": statistics.median(samples),
+        "p95_ms": samples[min(len(samples) - 1, int(len(samples) * 0.95))],
+        "max_ms": samples[-1],
+    }
+
+
+def percentiles(samples_ms: List[float]) -> Dict[str, float]:
+    """p50/p95/p99/max of latencies already in milliseconds."""
+    if not samples_ms:
+        return {"p50_ms": 0.0, "p95_ms": 0.0, "p99_ms": 0.0, "max_ms": 0.0}
+    ordered = sorted(samples_ms)
+    pick = lambda q: ordered[min(len(ordered) - 1, int(len(ordered) * q))]  # noqa: E731
+    return {
+        "p50_ms": round(statistics.median(ordered), 3),
+        "p95_ms": round(pick(0.95), 3),
+        "p99_ms": round(pick(0.99), 3),
+        "max_ms": round(ordered[-1], 3),
+    }
+
+
+def git_revision() -> str:
+    """Short commit hash of the working tree (``-dirty`` if it has local changes)."""
+    try:
+        sha = subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True).stdout.strip()
+        dirty = subprocess.run(["git", "status", "--porcelain", "--untracked-files=no"], capture_output=True, text=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+    return f"{sha}-dirty" if dirty else sha
+
+
+@contextmanager
+def serve(
+    db_path: Path,
+    port: int,
+    async_mode: bool = False,
+    query_delay_ms: float = 0.0,
+    pool_size: Optional[int] = None,
+    extra_env: Optional[Dict[str, str]] = None,
+) -> Iterator[str]:
+    """Run the API (``_serve.py`` under uvicorn) on ``db_path``; yields its base URL."""
+    env = {
+        **os.environ,
+        "DATABASE_URL": f"sqlite:///{db_path}",
+        "DB_ASYNC": "true" if async_mode else "false",
+        "LOG_LEVEL": "WARNING",
+        **(extra_env or {}),
+    }
+    command = [sys.executable, str(BENCH_DIR / "_serve.py"), "--port", str(port), "--query-delay-ms", str(query_delay_ms)]
+    if pool_size:
+        command += ["--pool-size", str(pool_size)]
+    server = subprocess.Popen(command, env=env, stdout=subprocess.DEVNULL)
+    base_url = f"http://127.0.0.1:{port}"
+    try:
+        deadline = time.time() + 60
+        while True:
+            try:
+                if httpx.get(base_url + "/").status_code == 200:
+                    break
+            except httpx.TransportError:
+                pass
+            if server.poll() is not None or time.time() > deadline:
+                raise RuntimeError("API server did not start")
+            time.sleep(0.2)
+        yield base_url
+    finally:
+        server.terminate()
+        server.wait()
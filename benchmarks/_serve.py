@@ -0,0 +1,58 @@
+"""
+Start the API under uvicorn for load benchmarks.
+
+Reads DATABASE_URL, DB_ASYNC and the DB_POOL_* settings from the environment
+like production, and can inject a fixed delay before every SQL statement to
+stand in for the network round trip to the remote pooler:
+
+    DATABASE_URL=sqlite:///bench.db DB_POOL_SIZE=50 python benchmarks/_serve.py --port 8790 --query-delay-ms 10
+"""
+
+from __future__ import annotations
+
+import argparse
+import asyncio
+import os
+import time
+
+import _common  # noqa: F401  (puts backend/ on sys.path)
+
+import uvicorn
+from sqlalchemy import event
+from sqlalchemy.util import await_only
+
+
+def inject_delay(database, seconds: float) -> None:
+    """Sleep before each statement: blocking in sync mode, awaited in async mode."""
+    if database.async_engine is not None:
+        @event.listens_for(database.async_engine.sync_engine, "before_cursor_execute")
+        def _async_delay(*_):
+            await_only(asyncio.sleep(seconds))
+    else:
+        @event.listens_for(database.engine, "before_cursor_execute")
+        def _sync_delay(*_):
+            time.sleep(seconds)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--port", type=int, default=8790)
+    parser.add_argument("--query-delay-ms", type=float, default=0.0)
+    parser.add_argument("--pool-size", type=int, help="shorthand for DB_POOL_SIZE=N DB_MAX_OVERFLOW=0")
+    args = parser.parse_args()
+
+    if args.pool_size:
+        os.environ["DB_POOL_SIZE"] = str(args.pool_size)
+        os.environ["DB_MAX_OVERFLOW"] = "0"
+    import database  # reads the environment on import
+
+    if args.query_delay_ms:
+        inject_delay(database, args.query_delay_ms / 1000)
+
+    import main as app_module
+
+    uvicorn.run(app_module.app, host="127.0.0.1", port=args.port, log_level="warning", timeout_keep_alive=30)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,85 @@
+"""
+Analytics benchmark: the daily_activity_rollup reads behind /analytics
+versus the same answers grouped straight from the transaction table.
+
+    python benchmarks/bench_analytics.py --scales 100000 300000
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import tempfile
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+
+from _common import seed, sqlite_engine, time_call
+
+from sqlalchemy import func
+from sqlmodel import Session, select
+
+from analytics import leaderboard, timeseries
+from models import Transaction
+from rollups import backfill_activity
+
+
+def raw_leaderboard(session: Session, days: int):
+    since = datetime.now(timezone.utc).replace(tzinfo=None) - timedelta(days=days)
+    points = func.sum(Transaction.points)
+    return session.exec(
+        select(Transaction.resident_id, points, func.count())
+        .where(Transaction.timestamp >= since)
+        .group_by(Transaction.resident_id)
+        .order_by(points.desc())
+        .limit(10)
+    ).all()
+
+
+def raw_timeseries(session: Session, days: int):
+    since = datetime.now(timezone.utc).replace(tzinfo=None) - timedelta(days=days)
+    day = func.date(Transaction.timestamp)
+    return session.exec(
+        select(day, Transaction.goal_id, func.sum(Transaction.points), func.count())
+        .where(Transaction.timestamp >= since)
+        .group_by(day, Transaction.goal_id)
+    ).all()
+
+
+def run_scale(rows: int, repeat: int, workdir: Path) -> dict:
+    engine = sqlite_engine(workdir / f"analytics_{rows}.db")
+    seed(engine, residents=100, goals=40, transactions=rows)
+    with Session(engine) as session:
+        backfill = time_call(lambda: backfill_activity(session), 1)
+        results = {
+            "rows": rows,
+            "backfill": backfill,
+            "leaderboard_7d": time_call(lambda: leaderboard(session, window_days=7), repeat),
+            "leaderboard_7d_raw": time_call(lambda: raw_leaderboard(session, 7), repeat),
+            "goal_series_90d": time_call(lambda: timeseries(session, group_by="goal", window_days=90), repeat),
+            "goal_series_90d_raw": time_call(lambda: raw_timeseries(session, 90), repeat),
+        }
+    engine.dispose()
+    return results
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--scales", type=int, nargs="+", default=[100_000, 300_000])
+    parser.add_argument("--repeat", type=int, default=20)
+    parser.add_argument("--output", type=Path, help="write results as JSON")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        results = [run_scale(n, args.repeat, Path(tmp)) for n in args.scales]
+
+    for result in results:
+        cells = "  ".join(
+            f"{name}={stats['p50_ms']:.2f}ms" for name, stats in result.items() if isinstance(stats, dict)
+        )
+        print(f"{result['rows']:>9} rows  {cells}")
+    if args.output:
+        args.output.write_text(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,291 @@
+"""
+End-to-end load test of the API with traffic modelled on the frontend.
+
+Seeds a SQLite stand-in at the chosen scale, starts ``backend/main.py`` under
+uvicorn, and runs simulated clients against it:
+
+  dashboard  App.jsx: GET /resident/, /goal/ and /transaction/?limit=200 together,
+             every 20s (browser-style If-None-Match revalidation)
+  display    ResidentDashboard.jsx: GET /resident/summary?recent=3 every 60s
+  staff      TransactionForm.jsx: a burst of POST /transaction/ (one per resident
+             in a group), then the dashboard refresh, every 30s
+
+``--time-scale`` compresses those intervals (0.02 turns a 20s poll into 400ms)
+so a short run sees the same request mix a real day would. Throughput and
+p50/p95/p99 per endpoint are printed and saved as JSON under
+benchmarks/results/ (named by mix, scale and git revision); ``--compare``
+prints the change against an earlier result file.
+
+    python benchmarks/bench_api.py --scale medium --mix burst
+    python benchmarks/bench_api.py --scale large --mix polling --compare benchmarks/results/polling-large-abc1234.json
+"""
+
+from __future__ import annotations
+
+import argparse
+import asyncio
+import json
+import platform
+import random
+import tempfile
+import time
+from collections import defaultdict
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Dict, List, Optional
+
+import httpx
+
+from _common import BENCH_DIR, git_revision, percentiles, seed, serve, sqlite_engine
+
+from sqlmodel import Session
+
+import rollups
+
+SCALES = {
+    "small": {"residents": 20, "goals": 10, "transactions": 10_000},
+    "medium": {"residents": 100, "goals": 40, "transactions": 100_000},
+    "large": {"residents": 100, "goals": 40, "transactions": 1_000_000},
+}
+
+# Client counts sized so a laptop doesn't saturate; raise them (and watch p99) to find the knee.
+MIXES = {
+    "polling": {"dashboard": 8, "display": 4, "staff": 0},
+    "burst": {"dashboard": 8, "display": 4, "staff": 2},
+    "writes": {"dashboard": 2, "display": 0, "staff": 8},
+}
+
+DASHBOARD_SECONDS = 20
+DISPLAY_SECONDS = 60
+STAFF_SECONDS = 30
+BURST_SIZE = 8
+
+
+# ==========================================================
+# 1️⃣  Recording
+# ==========================================================
+class Recorder:
+    def __init__(self) -> None:
+        self.latencies: Dict[str, List[float]] = defaultdict(list)
+        self.statuses: Dict[str, Dict[int, int]] = defaultdict(lambda: defaultdict(int))
+        self.transport_errors: Dict[str, int] = defaultdict(int)
+
+    async def call(self, client: httpx.AsyncClient, name: str, method: str, url: str, **kwargs) -> Optional[httpx.Response]:
+        started = time.perf_counter()
+        try:
+            response = await client.request(method, url, **kwargs)
+        except httpx.TransportError:
+            self.transport_errors[name] += 1
+            return None
+        self.latencies[name].append((time.perf_counter() - started) * 1000)
+        self.statuses[name][response.status_code] += 1
+        return response
+
+    def report(self, seconds: float) -> Dict[str, dict]:
+        endpoints = {}
+        for name in sorted(self.latencies.keys() | self.transport_errors.keys()):
+            samples = self.latencies.get(name, [])
+            statuses = self.statuses.get(name, {})
+            errors = sum(n for code, n in statuses.items() if code >= 400) + self.transport_errors.get(name, 0)
+            endpoints[name] = {
+                "requests": len(samples),
+                "rps": round(len(samples) / seconds, 2),
+                "errors": errors,
+                "not_modified": statuses.get(304, 0),
+                **percentiles(samples),
+            }
+        everything = [ms for samples in self.latencies.values() for ms in samples]
+        total = {
+            "requests": len(everything),
+            "rps": round(len(everything) / seconds, 2),
+            "errors": sum(e["errors"] for e in endpoints.values()),
+            **percentiles(everything),
+        }
+        return {"endpoints": endpoints, "total": total}
+
+
+# ==========================================================
+# 2️⃣  Simulated clients
+# ==========================================================
+class Browser:
+    """Remembers ETags per URL and revalidates like a browser does with Cache-Control: no-cache."""
+
+    def __init__(self, client: httpx.AsyncClient, recorder: Recorder, etags: bool) -> None:
+        self.client = client
+        self.recorder = recorder
+        self.use_etags = etags
+        self.etags: Dict[str, str] = {}
+
+    async def get(self, name: str, url: str, params: Optional[dict] = None) -> None:
+        key = f"{url}?{sorted((params or {}).items())}"
+        headers = {"If-None-Match": self.etags[key]} if self.use_etags and key in self.etags else {}
+        response = await self.recorder.call(self.client, name, "GET", url, params=params, headers=headers)
+        if response is not None and response.headers.get("etag"):
+            self.etags[key] = response.headers["etag"]
+
+    async def refresh_all(self) -> None:
+        await asyncio.gather(
+            self.get("GET /resident/", "/resident/"),
+            self.get("GET /goal/", "/goal/"),
+            self.get("GET /transaction/", "/transaction/", {"limit": 200}),
+        )
+
+
+async def pause(seconds: float, deadline: float, rng: random.Random) -> None:
+    # +-20% jitter so clients don't poll in lockstep
+    await asyncio.sleep(min(seconds * rng.uniform(0.8, 1.2), max(deadline - time.perf_counter(), 0)))
+
+
+async def dashboard(browser: Browser, scale: float, deadline: float, rng: random.Random) -> None:
+    await pause(DASHBOARD_SECONDS * scale * rng.random(), deadline, rng)
+    while time.perf_counter() < deadline:
+        await browser.refresh_all()
+        await pause(DASHBOARD_SECONDS * scale, deadline, rng)
+
+
+async def display(browser: Browser, scale: float, deadline: float, rng: random.Random) -> None:
+    await pause(DISPLAY_SECONDS * scale * rng.random(), deadline, rng)
+    while time.perf_counter() < deadline:
+        await browser.get("GET /resident/summary", "/resident/summary", {"recent": 3})
+        await pause(DISPLAY_SECONDS * scale, deadline, rng)
+
+
+async def staff(browser: Browser, scale: float, deadline: float, rng: random.Random, residents: int, goals: int) -> None:
+    await pause(STAFF_SECONDS * scale * rng.random(), deadline, rng)
+    while time.perf_counter() < deadline:
+        goal_id = rng.randint(1, goals)
+        group = rng.sample(range(1, residents + 1), min(BURST_SIZE, residents))
+        for resident_id in group:
+            await browser.recorder.call(
+                browser.client,
+                "POST /transaction/",
+                "POST",
+                "/transaction/",
+                json={"resident_id": resident_id, "goal_id": goal_id, "staff_name": "bench"},
+            )
+        await browser.refresh_all()  # handleDataChanged -> fetchAll
+        await pause(STAFF_SECONDS * scale, deadline, rng)
+
+
+async def drive(base_url: str, mix: Dict[str, int], data: Dict[str, int], args) -> dict:
+    recorder = Recorder()
+    rng = random.Random(args.seed)
+    users = sum(mix.values())
+    limits = httpx.Limits(max_connections=max(users, 1) * 3, max_keepalive_connections=max(users, 1) * 3)
+    async with httpx.AsyncClient(base_url=base_url, limits=limits, timeout=60) as client:
+        started = time.perf_counter()
+        deadline = started + args.duration
+        tasks = []
+        for _ in range(mix["dashboard"]):
+            tasks.append(dashboard(Browser(client, recorder, not args.no_etags), args.time_scale, deadline, random.Random(rng.random())))
+        for _ in range(mix["display"]):
+            tasks.append(display(Browser(client, recorder, not args.no_etags), args.time_scale, deadline, random.Random(rng.random())))
+        for _ in range(mix["staff"]):
+            tasks.append(
+                staff(Browser(client, recorder, not args.no_etags), args.time_scale, deadline, random.Random(rng.random()), data["residents"], data["goals"])
+            )
+        await asyncio.gather(*tasks)
+        elapsed = time.perf_counter() - started
+    return {"seconds": round(elapsed, 3), **recorder.report(elapsed)}
+
+
+# ==========================================================
+# 3️⃣  Output
+# ==========================================================
+def print_report(result: dict) -> None:
+    print(f"{'endpoint':<24}{'req':>8}{'rps':>9}{'p50':>9}{'p95':>9}{'p99':>9}{'304s':>7}{'err':>6}")
+    rows = list(result["endpoints"].items()) + [("TOTAL", result["total"])]
+    for name, stats in rows:
+        print(
+            f"{name:<24}{stats['requests']:>8}{stats['rps']:>9.1f}{stats['p50_ms']:>9.1f}"
+            f"{stats['p95_ms']:>9.1f}{stats['p99_ms']:>9.1f}{stats.get('not_modified', ''):>7}{stats['errors']:>6}"
+        )
+
+
+def print_comparison(result: dict, baseline: dict) -> None:
+    print(f"\nvs {baseline['meta']['revision']} ({baseline['meta']['started_at']}):")
+    differing = sorted(k for k in result["config"] if result["config"][k] != baseline["config"].get(k))
+    if differing:
+        print(f"  (not like-for-like: {', '.join(differing)} differ)")
+    old = {**baseline["endpoints"], "TOTAL": baseline["total"]}
+    new = {**result["endpoints"], "TOTAL": result["total"]}
+    for name in new:
+        if name not in old:
+            continue
+        cells = []
+        for key in ("rps", "p50_ms", "p95_ms", "p99_ms"):
+            before, after = old[name][key], new[name][key]
+            change = f"{(after - before) / before * 100:+.0f}%" if before else "n/a"
+            cells.append(f"{key.removesuffix('_ms')} {before:.1f}->{after:.1f} ({change})")
+        print(f"  {name:<24}" + "  ".join(cells))
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--scale", choices=SCALES, default="small")
+    parser.add_argument("--residents", type=int, help="override the scale's resident count")
+    parser.add_argument("--goals", type=int, help="override the scale's goal count")
+    parser.add_argument("--transactions", type=int, help="override the scale's ledger size")
+    parser.add_argument("--mix", choices=MIXES, default="burst")
+    parser.add_argument("--dashboards", type=int, help="override the mix's dashboard clients")
+    parser.add_argument("--displays", type=int, help="override the mix's display clients")
+    parser.add_argument("--staff", type=int, help="override the mix's staff clients")
+    parser.add_argument("--duration", type=float, default=30, help="seconds of load")
+    parser.add_argument("--time-scale", type=float, default=0.02, help="multiplier for the frontend's poll intervals")
+    parser.add_argument("--no-etags", action="store_true", help="never send If-None-Match")
+    parser.add_argument("--async", dest="async_mode", action="store_true", help="run the API with DB_ASYNC=true")
+    parser.add_argument("--query-delay-ms", type=float, default=0.0, help="latency injected before each SQL statement")
+    parser.add_argument("--port", type=int, default=8795)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--output", type=Path, help="defaults to benchmarks/results/<mix>-<scale>-<revision>.json")
+    parser.add_argument("--compare", type=Path, help="earlier result file to diff against")
+    args = parser.parse_args()
+
+    data = {key: getattr(args, key) or value for key, value in SCALES[args.scale].items()}
+    mix = dict(MIXES[args.mix])
+    for key, override in (("dashboard", args.dashboards), ("display", args.displays), ("staff", args.staff)):
+        if override is not None:
+            mix[key] = override
+
+    revision = git_revision()
+    meta = {
+        "revision": revision,
+        "started_at": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "machine": platform.machine(),
+    }
+    config = {
+        "scale": args.scale,
+        **data,
+        "mix": args.mix,
+        "clients": mix,
+        "duration": args.duration,
+        "time_scale": args.time_scale,
+        "etags": not args.no_etags,
+        "async": args.async_mode,
+        "query_delay_ms": args.query_delay_ms,
+    }
+
+    with tempfile.TemporaryDirectory() as tmp:
+        db_path = Path(tmp) / "api_bench.db"
+        print(f"Seeding {data['residents']} residents, {data['goals']} goals, {data['transactions']} transactions...")
+        engine = sqlite_engine(db_path)
+        seed(engine, residents=data["residents"], goals=data["goals"], transactions=data["transactions"], seed_value=args.seed)
+        with Session(engine) as session:
+            rollups.rebuild(session)  # summaries read the rollups, not the ledger
+        engine.dispose()
+        with serve(db_path, args.port, async_mode=args.async_mode, query_delay_ms=args.query_delay_ms) as base_url:
+            print(f"Driving {mix} for {args.duration:.0f}s...")
+            result = {"meta": meta, "config": config, **asyncio.run(drive(base_url, mix, data, args))}
+
+    print_report(result)
+    output = args.output or BENCH_DIR / "results" / f"{args.mix}-{args.scale}-{revision}.json"
+    output.parent.mkdir(parents=True, exist_ok=True)
+    output.write_text(json.dumps(result, indent=2))
+    print(f"\nSaved {output}")
+    if args.compare:
+        print_comparison(result, json.loads(args.compare.read_text()))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,114 @@
+"""
+Sync vs async request path under simulated network latency.
+
+Seeds a SQLite stand-in, then for each mode starts the API in a separate
+process (DB_ASYNC=false / true) with a fixed delay injected before every SQL
+statement, and drives a read-heavy mix of the frontend's polling requests at
+a fixed concurrency. Reports requests/second and p50/p99 latency.
+
+``--database-url`` runs both modes against an empty scratch PostgreSQL
+database instead (its tables are dropped and recreated), which exercises the
+real pg8000 and asyncpg drivers rather than SQLite's.
+
+Client and server share the machine, so keep --concurrency modest on small
+boxes or the run measures the load generator instead of the API.
+
+    python benchmarks/bench_async_mode.py --concurrency 50 --query-delay-ms 20
+    python benchmarks/bench_async_mode.py --query-delay-ms 0 --database-url postgresql://postgres@localhost/scratch
+"""
+
+from __future__ import annotations
+
+import argparse
+import asyncio
+import json
+import statistics
+import tempfile
+import time
+from pathlib import Path
+from typing import Optional
+
+import httpx
+
+from _common import scratch_engine, seed, serve, sqlite_engine
+
+READ_MIX = ["/resident/", "/goal/", "/transaction/?limit=50", "/resident/summary?recent=3"]
+
+
+async def drive(base_url: str, concurrency: int, duration: float) -> dict:
+    latencies = []
+    errors = 0
+    deadline = time.perf_counter() + duration
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+    async with httpx.AsyncClient(base_url=base_url, limits=limits, timeout=60) as client:
+        async def worker(offset: int) -> None:
+            nonlocal errors
+            i = offset
+            while time.perf_counter() < deadline:
+                started = time.perf_counter()
+                try:
+                    response = await client.get(READ_MIX[i % len(READ_MIX)])
+                    errors += response.status_code >= 400
+                except httpx.TransportError:
+                    errors += 1
+                latencies.append(time.perf_counter() - started)
+                i += 1
+
+        started = time.perf_counter()
+        await asyncio.gather(*(worker(n) for n in range(concurrency)))
+        elapsed = time.perf_counter() - started
+
+    latencies.sort()
+    return {
+        "requests": len(latencies),
+        "errors": errors,
+        "rps": round(len(latencies) / elapsed, 1),
+        "p50_ms": round(statistics.median(latencies) * 1000, 1),
+        "p99_ms": round(latencies[int(len(latencies) * 0.99)] * 1000, 1),
+    }
+
+
+def run_mode(mode: str, db_path: Path, args, database_url: Optional[str] = None) -> dict:
+    port = args.port + (mode == "async")
+    extra_env = {"DATABASE_URL": database_url} if database_url else None
+    with serve(
+        db_path,
+        port,
+        async_mode=mode == "async",
+        query_delay_ms=args.query_delay_ms,
+        pool_size=args.pool_size,
+        extra_env=extra_env,
+    ) as base_url:
+        asyncio.run(drive(base_url, min(args.concurrency, 20), 2))  # warm-up
+        result = asyncio.run(drive(base_url, args.concurrency, args.duration))
+    return {"mode": mode, **result}
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--concurrency", type=int, default=50)
+    parser.add_argument("--duration", type=float, default=15)
+    parser.add_argument("--query-delay-ms", type=float, default=20)
+    parser.add_argument("--pool-size", type=int, default=100)
+    parser.add_argument("--transactions", type=int, default=20_000)
+    parser.add_argument("--port", type=int, default=8790)
+    parser.add_argument("--database-url", help="scratch PostgreSQL database to use instead of SQLite (tables are recreated)")
+    parser.add_argument("--output", type=Path, help="write results as JSON")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        db_path = Path(tmp) / "async_bench.db"
+        engine = scratch_engine(args.database_url) if args.database_url else sqlite_engine(db_path)
+        seed(engine, residents=100, goals=40, transactions=args.transactions)
+        engine.dispose()
+        results = [run_mode(mode, db_path, args, args.database_url) for mode in ("sync", "async")]
+
+    print(f"concurrency {args.concurrency}, {args.query_delay_ms}ms injected per statement")
+    for r in results:
+        print(f"  {r['mode']:>5}: {r['rps']} req/s, p50 {r['p50_ms']}ms, p99 {r['p99_ms']}ms, {r['errors']} errors / {r['requests']}")
+    if args.output:
+        args.output.write_text(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
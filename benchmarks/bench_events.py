@@ -0,0 +1,125 @@
+"""
+Fan-out load test for the /events hub.
+
+Runs hundreds of simulated SSE subscribers on one event loop (one worker),
+each consuming the real ``event_stream`` generator. A background thread
+publishes change events the way sync handlers do after commit. A share of
+the subscribers are deliberately slow; they should be cut over to a single
+``resync`` instead of growing their queues or slowing everyone else down.
+
+    python benchmarks/bench_events.py --subscribers 500 --events 2000 --slow 0.1
+"""
+
+from __future__ import annotations
+
+import argparse
+import asyncio
+import json
+import statistics
+import threading
+import time
+from pathlib import Path
+
+import _common  # noqa: F401  (puts backend/ on sys.path)
+
+from events import EventHub, event_stream
+
+
+class SimulatedRequest:
+    """Just enough of starlette's Request for event_stream."""
+
+    def __init__(self) -> None:
+        self.closed = False
+
+    async def is_disconnected(self) -> bool:
+        return self.closed
+
+
+async def consume(hub: EventHub, request: SimulatedRequest, delay: float, stats: dict) -> None:
+    async for chunk in event_stream(request, {"transaction": 0}, events_hub=hub):
+        if not chunk.startswith("event: change"):
+            if chunk.startswith("event: resync"):
+                stats["resyncs"] += 1
+            continue
+        payload = json.loads(chunk.split("data: ", 1)[1])
+        stats["latencies"].append(time.perf_counter() - payload["sent_at"])
+        stats["delivered"] += 1
+        if delay:
+            await asyncio.sleep(delay)
+
+
+async def run(subscribers: int, events: int, rate: float, slow_share: float, slow_delay: float, queue_size: int) -> dict:
+    hub = EventHub(queue_size=queue_size)
+    fast = {"delivered": 0, "resyncs": 0, "latencies": []}
+    slow = {"delivered": 0, "resyncs": 0, "latencies": []}
+    requests = []
+    tasks = []
+    slow_count = int(subscribers * slow_share)
+    for i in range(subscribers):
+        request = SimulatedRequest()
+        requests.append(request)
+        is_slow = i < slow_count
+        tasks.append(asyncio.create_task(consume(hub, request, slow_delay if is_slow else 0, slow if is_slow else fast)))
+    while hub.subscriber_count < subscribers:
+        await asyncio.sleep(0.01)
+
+    def publisher() -> None:
+        interval = 1 / rate if rate else 0
+        for i in range(events):
+            hub.publish({"type": "change", "table": "transaction", "op": "upsert", "ids": [i], "version": i, "sent_at": time.perf_counter()})
+            if interval:
+                time.sleep(interval)
+
+    started = time.perf_counter()
+    thread = threading.Thread(target=publisher)
+    thread.start()
+    await asyncio.to_thread(thread.join)
+    await asyncio.sleep(0.5)  # let fast consumers drain
+    elapsed = time.perf_counter() - started
+
+    for request in requests:
+        request.closed = True
+    await asyncio.wait(tasks, timeout=1)
+    for task in tasks:
+        task.cancel()
+
+    def summary(stats: dict, count: int) -> dict:
+        lat = sorted(stats["latencies"]) or [0.0]
+        return {
+            "subscribers": count,
+            "delivered": stats["delivered"],
+            "resyncs": stats["resyncs"],
+            "p50_ms": round(statistics.median(lat) * 1000, 3),
+            "p99_ms": round(lat[min(len(lat) - 1, int(len(lat) * 0.99))] * 1000, 3),
+        }
+
+    return {
+        "events": events,
+        "seconds": round(elapsed, 3),
+        "fast": summary(fast, subscribers - slow_count),
+        "slow": summary(slow, slow_count),
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--subscribers", type=int, default=500)
+    parser.add_argument("--events", type=int, default=2000)
+    parser.add_argument("--rate", type=float, default=200, help="events per second (0 = as fast as possible)")
+    parser.add_argument("--slow", type=float, default=0.1, help="share of subscribers that consume slowly")
+    parser.add_argument("--slow-delay", type=float, default=0.05, help="seconds a slow subscriber spends per event")
+    parser.add_argument("--queue-size", type=int, default=256)
+    parser.add_argument("--output", type=Path, help="write results as JSON")
+    args = parser.parse_args()
+
+    result = asyncio.run(run(args.subscribers, args.events, args.rate, args.slow, args.slow_delay, args.queue_size))
+    expected = result["events"] * result["fast"]["subscribers"]
+    print(f"{result['events']} events to {args.subscribers} subscribers in {result['seconds']}s")
+    print(f"  fast: {result['fast']['delivered']}/{expected} delivered, p50 {result['fast']['p50_ms']}ms, p99 {result['fast']['p99_ms']}ms, {result['fast']['resyncs']} resyncs")
+    print(f"  slow: {result['slow']['delivered']} delivered, {result['slow']['resyncs']} resyncs")
+    if args.output:
+        args.output.write_text(json.dumps(result, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,121 @@
+"""
+Memory and time-to-first-byte benchmark for ``GET /transaction/export``.
+
+For each ledger size, runs two fresh worker processes against the same
+seeded SQLite file and reports their peak RSS growth (ru_maxrss after the
+work minus before it):
+
+* ``export``   — drains ``export.export_chunks`` (server-side cursor, fixed batches).
+* ``buffered`` — the old way to get the history: ``GET /transaction/`` without
+  a limit, i.e. every row loaded and encoded in one go.
+
+The export's peak should stay flat as the ledger grows; the buffered one grows
+with it.
+
+    python benchmarks/bench_export.py --scales 10000 100000 300000
+"""
+
+from __future__ import annotations
+
+import argparse
+import asyncio
+import json
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+from _common import seed, sqlite_engine
+
+
+def _peak_kib() -> int:
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+
+def worker(db_path: str, mode: str, fmt: str) -> dict:
+    """Runs in the child process; DATABASE_URL must be set before the imports."""
+    os.environ["DATABASE_URL"] = f"sqlite:///{db_path}"
+    os.environ["LOG_LEVEL"] = "WARNING"
+    from export import export_chunks
+    from ledger import transaction_page
+    from models import Transaction
+    from serialization import encode_rows, table_columns
+    from sqlmodel import Session
+    import database
+
+    before = _peak_kib()
+    started = time.perf_counter()
+    first_byte = None
+    size = 0
+    if mode == "export":
+
+        async def drain() -> None:
+            nonlocal first_byte, size
+            header = fmt == "csv"  # sent before the query runs; time the first batch instead
+            async for chunk in export_chunks(fmt):
+                if header:
+                    header = False
+                elif first_byte is None:
+                    first_byte = time.perf_counter() - started
+                size += len(chunk)
+
+        asyncio.run(drain())
+    else:
+        with Session(database.engine) as session:
+            body = encode_rows(transaction_page(session, columns=table_columns(Transaction))[0])
+        first_byte = time.perf_counter() - started
+        size = len(body)
+    return {
+        "mode": mode,
+        "first_byte_ms": round((first_byte or 0) * 1000, 1),
+        "total_ms": round((time.perf_counter() - started) * 1000, 1),
+        "bytes": size,
+        "peak_rss_growth_mib": round((_peak_kib() - before) / 1024, 1),
+    }
+
+
+def run_worker(db_path: Path, mode: str, fmt: str) -> dict:
+    output = subprocess.run(
+        [sys.executable, __file__, "--worker", str(db_path), mode, "--format", fmt],
+        check=True,
+        capture_output=True,
+        text=True,
+    ).stdout
+    return json.loads(output.splitlines()[-1])
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--scales", type=int, nargs="+", default=[10_000, 100_000, 300_000])
+    parser.add_argument("--format", choices=["csv", "ndjson"], default="csv")
+    parser.add_argument("--output", type=Path, help="write results as JSON")
+    parser.add_argument("--worker", nargs=2, metavar=("DB_PATH", "MODE"), help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.worker:
+        print(json.dumps(worker(args.worker[0], args.worker[1], args.format)))
+        return
+
+    results = []
+    with tempfile.TemporaryDirectory() as tmp:
+        for rows in args.scales:
+            db_path = Path(tmp) / f"export_{rows}.db"
+            engine = sqlite_engine(db_path)
+            seed(engine, residents=100, goals=40, transactions=rows)
+            engine.dispose()
+            for mode in ("export", "buffered"):
+                result = {"rows": rows, **run_worker(db_path, mode, args.format)}
+                results.append(result)
+                print(
+                    f"{rows:>9} rows  {mode:<8}  first byte {result['first_byte_ms']:8.1f}ms"
+                    f"  total {result['total_ms']:8.1f}ms  peak RSS +{result['peak_rss_growth_mib']:6.1f} MiB"
+                )
+    if args.output:
+        args.output.write_text(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,111 @@
+"""
+Retention benchmark: deleting a resident set-based versus loading and deleting
+their rows one by one through the ORM, and hot-table reads before and after
+archiving everything older than --archive-days.
+
+    python benchmarks/bench_retention.py --scales 100000 300000
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import os
+import shutil
+import tempfile
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+
+from _common import seed, sqlite_engine, time_call
+
+# export imports database, which wants a URL; every engine here is built explicitly.
+os.environ.setdefault("DATABASE_URL", "sqlite://")
+
+from sqlalchemy import create_engine
+from sqlmodel import Session, select
+
+from archive import archive_transactions
+from export import export_statement
+from ledger import remove_resident, transaction_page
+from models import Resident, Transaction
+from rollups import forget_resident, reconcile
+from serialization import table_columns
+
+
+def orm_delete_resident(session: Session, resident_id: int) -> None:
+    """What a delete-orphan cascade does: load every row, then one DELETE each."""
+    forget_resident(session, resident_id)
+    for tx in session.exec(select(Transaction).where(Transaction.resident_id == resident_id)).all():
+        session.delete(tx)
+    session.delete(session.get(Resident, resident_id))
+    session.commit()
+
+
+def set_based_delete_resident(session: Session, resident_id: int) -> None:
+    remove_resident(session, resident_id)
+    session.commit()
+
+
+def hot_reads(session: Session, repeat: int) -> dict:
+    return {
+        "full_list": time_call(lambda: transaction_page(session, columns=table_columns(Transaction)), repeat),
+        "reconcile": time_call(lambda: reconcile(session), repeat),
+        "export_all": time_call(lambda: session.exec(export_statement()).all(), max(1, repeat // 4)),
+    }
+
+
+def run_scale(rows: int, repeat: int, archive_days: int, workdir: Path) -> dict:
+    path = workdir / f"retention_{rows}.db"
+    engine = sqlite_engine(path)
+    seed(engine, residents=100, goals=40, transactions=rows)
+    engine.dispose()
+
+    results: dict = {"rows": rows}
+    for name, delete in (("delete_orm", orm_delete_resident), ("delete_set_based", set_based_delete_resident)):
+        copy = workdir / f"{name}_{rows}.db"
+        shutil.copy(path, copy)
+        engine = create_engine(f"sqlite:///{copy}")
+        with Session(engine) as session:
+            results[name] = time_call(lambda: delete(session, 1), 1)
+        engine.dispose()
+
+    engine = create_engine(f"sqlite:///{path}")
+    with Session(engine) as session:
+        results["before"] = hot_reads(session, repeat)
+        cutoff = datetime.now(timezone.utc).replace(tzinfo=None) - timedelta(days=archive_days)
+        moved = []
+        results["archive_job"] = time_call(lambda: moved.append(archive_transactions(session, cutoff)), 1)
+        results["archived_rows"] = moved[0]
+        results["after"] = hot_reads(session, repeat)
+    engine.dispose()
+    return results
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--scales", type=int, nargs="+", default=[100_000, 300_000])
+    parser.add_argument("--repeat", type=int, default=8)
+    parser.add_argument("--archive-days", type=int, default=90)
+    parser.add_argument("--output", type=Path, help="write results as JSON")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        results = [run_scale(n, args.repeat, args.archive_days, Path(tmp)) for n in args.scales]
+
+    for result in results:
+        print(
+            f"{result['rows']:>9} rows  delete_orm={result['delete_orm']['p50_ms']:.1f}ms  "
+            f"delete_set_based={result['delete_set_based']['p50_ms']:.1f}ms  "
+            f"archive_job={result['archive_job']['p50_ms']:.0f}ms ({result['archived_rows']} rows)"
+        )
+        for name in result["before"]:
+            print(
+                f"{'':>15}{name}: {result['before'][name]['p50_ms']:.1f}ms -> "
+                f"{result['after'][name]['p50_ms']:.1f}ms after archiving"
+            )
+    if args.output:
+        args.output.write_text(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,105 @@
+"""
+Response serialization benchmark for the list endpoints.
+
+Times the full history of ``GET /transaction/`` two ways against the same
+seeded ledger:
+
+* ``orm``  — the old path: load ``Transaction`` entities, validate them
+  through the route's ``response_model`` and encode with ``JSONResponse``.
+* ``rows`` — the current path: select the table's columns as tuples and
+  encode them with orjson (``serialization.encode_rows``).
+
+Each iteration runs one request's query and then encodes that query's
+result, timing both steps and their sum together, so ``total`` is always the
+query plus encode of the same run. The two bodies are checked for equal
+content before anything is timed.
+
+    python benchmarks/bench_serialization.py --transactions 100000
+"""
+
+from __future__ import annotations
+
+import argparse
+import asyncio
+import json
+import tempfile
+import time
+from pathlib import Path
+from typing import Callable, Dict, List
+
+from _common import percentiles, seed, sqlite_engine
+
+from fastapi.responses import JSONResponse
+from fastapi.routing import serialize_response
+from fastapi.utils import create_model_field
+from sqlmodel import Session
+
+from ledger import transaction_page
+from models import Transaction
+from serialization import encode_rows, table_columns
+
+# What FastAPI builds for ``response_model=List[Transaction]``.
+RESPONSE_FIELD = create_model_field(name="Response_list_transactions", type_=List[Transaction], mode="serialization")
+
+
+def orm_query(session: Session):
+    session.expunge_all()  # a fresh request starts with an empty identity map
+    return transaction_page(session)[0]
+
+
+def orm_encode(rows) -> bytes:
+    content = asyncio.run(serialize_response(field=RESPONSE_FIELD, response_content=rows))
+    return JSONResponse(content).body
+
+
+def rows_query(session: Session):
+    return transaction_page(session, columns=table_columns(Transaction))[0]
+
+
+def time_request(query: Callable[[], object], encode: Callable[[object], bytes], repeat: int) -> Dict[str, dict]:
+    """Query then encode ``repeat`` times, splitting each iteration into its two steps."""
+    samples: Dict[str, List[float]] = {"query": [], "encode": [], "total": []}
+    for _ in range(repeat):
+        started = time.perf_counter()
+        rows = query()
+        queried = time.perf_counter()
+        encode(rows)
+        finished = time.perf_counter()
+        samples["query"].append((queried - started) * 1000)
+        samples["encode"].append((finished - queried) * 1000)
+        samples["total"].append((finished - started) * 1000)
+    return {stage: percentiles(values) for stage, values in samples.items()}
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--transactions", type=int, default=100_000)
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--output", type=Path, help="write results as JSON")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        engine = sqlite_engine(Path(tmp) / "serialization.db")
+        seed(engine, residents=100, goals=40, transactions=args.transactions)
+        with Session(engine) as session:
+            orm_rows, tuple_rows = orm_query(session), rows_query(session)
+            if json.loads(orm_encode(orm_rows)) != json.loads(encode_rows(tuple_rows)):
+                raise SystemExit("bodies differ between the ORM and row paths")
+
+            results = {
+                "transactions": args.transactions,
+                "orm": time_request(lambda: orm_query(session), orm_encode, args.repeat),
+                "rows": time_request(lambda: rows_query(session), encode_rows, args.repeat),
+            }
+        engine.dispose()
+
+    print(f"{args.transactions} transactions, p50 of {args.repeat} runs")
+    for stage in ("query", "encode", "total"):
+        before, after = results["orm"][stage]["p50_ms"], results["rows"][stage]["p50_ms"]
+        print(f"  {stage:<7} orm {before:9.1f}ms   rows {after:9.1f}ms   {before / after:5.1f}x")
+    if args.output:
+        args.output.write_text(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
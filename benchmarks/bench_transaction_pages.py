@@ -0,0 +1,72 @@
+"""
+Keyset pagination benchmark for ``GET /transaction/``.
+
+Seeds the ledger at several sizes and times the newest page, a page deep in
+the history (via cursor), and resident/staff-filtered pages. With the
+composite (…, timestamp, id) indexes these should stay flat as the table grows;
+``--baseline`` also times the old unpaginated ``select(Transaction)`` for contrast.
+
+    python benchmarks/bench_transaction_pages.py --scales 10000 100000 1000000
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import tempfile
+from pathlib import Path
+
+from _common import seed, sqlite_engine, time_call
+
+from sqlmodel import Session, select
+
+from ledger import encode_cursor, transaction_page
+from models import Transaction
+
+
+def run_scale(rows: int, page_size: int, repeat: int, baseline: bool, workdir: Path) -> dict:
+    engine = sqlite_engine(workdir / f"pages_{rows}.db")
+    seed(engine, residents=100, goals=40, transactions=rows)
+
+    with Session(engine) as session:
+        middle = session.exec(
+            select(Transaction).order_by(Transaction.timestamp.desc(), Transaction.id.desc()).offset(rows // 2).limit(1)
+        ).one()
+        deep_cursor = encode_cursor(middle)
+
+        results = {
+            "rows": rows,
+            "first_page": time_call(lambda: transaction_page(session, limit=page_size), repeat),
+            "deep_page": time_call(lambda: transaction_page(session, limit=page_size, cursor=deep_cursor), repeat),
+            "resident_page": time_call(lambda: transaction_page(session, resident_id=7, limit=page_size), repeat),
+            "staff_page": time_call(lambda: transaction_page(session, staff_name="Casey", limit=page_size), repeat),
+        }
+        if baseline:
+            results["full_list_baseline"] = time_call(lambda: session.exec(select(Transaction)).all(), 3)
+    engine.dispose()
+    return results
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--scales", type=int, nargs="+", default=[10_000, 100_000, 1_000_000])
+    parser.add_argument("--page-size", type=int, default=50)
+    parser.add_argument("--repeat", type=int, default=200)
+    parser.add_argument("--baseline", action="store_true", help="also time the unpaginated full list")
+    parser.add_argument("--output", type=Path, help="write results as JSON")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        results = [run_scale(n, args.page_size, args.repeat, args.baseline, Path(tmp)) for n in args.scales]
+
+    for result in results:
+        cells = "  ".join(
+            f"{name}={stats['p50_ms']:.2f}ms" for name, stats in result.items() if isinstance(stats, dict)
+        )
+        print(f"{result['rows']:>9} rows  {cells}")
+    if args.output:
+        args.output.write_text(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
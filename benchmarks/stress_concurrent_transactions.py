@@ -0,0 +1,133 @@
+"""
+Concurrent balance-update stress test.
+
+Fires thousands of transactions from many threads at a handful of hot
+residents, then checks that every resident's token_balance equals the sum of
+their ledger rows. Two write paths are compared:
+
+  legacy  the old handler: session.get(resident); resident.token_balance += points
+  atomic  ledger.record_transaction: UPDATE ... SET token_balance = token_balance + :delta
+
+Exits non-zero if the atomic path loses an update. Defaults to a SQLite file;
+pass --database-url to aim it at a scratch PostgreSQL database instead.
+
+    python benchmarks/stress_concurrent_transactions.py --threads 32 --transactions 5000
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import random
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+from _common import seed
+
+from sqlalchemy import func
+from sqlmodel import SQLModel, Session, create_engine, select
+
+from ledger import record_transaction
+from models import Goal, Resident, Transaction
+
+
+def legacy_write(session: Session, item: Transaction) -> None:
+    """The pre-change create_transaction body, kept here as the baseline."""
+    resident = session.get(Resident, item.resident_id)
+    goal = session.get(Goal, item.goal_id)
+    points_value = item.points if item.points is not None else goal.points
+    db_transaction = Transaction(
+        resident_id=item.resident_id,
+        goal_id=item.goal_id,
+        staff_name=item.staff_name,
+        points=points_value,
+    )
+    resident.token_balance += points_value
+    session.add_all([db_transaction, resident])
+    session.commit()
+
+
+def run(mode: str, url: str, threads: int, transactions: int, residents: int) -> dict:
+    connect_args = {"check_same_thread": False, "timeout": 60} if url.startswith("sqlite") else {}
+    engine = create_engine(url, connect_args=connect_args, pool_size=threads, max_overflow=0)
+    SQLModel.metadata.drop_all(engine)
+    SQLModel.metadata.create_all(engine)
+    seed(engine, residents=residents, goals=5, transactions=0)
+
+    write = legacy_write if mode == "legacy" else record_transaction
+    rng = random.Random(7)
+    work = [
+        Transaction(resident_id=rng.randint(1, residents), goal_id=rng.randint(1, 5), points=rng.randint(1, 5), staff_name="stress")
+        for _ in range(transactions)
+    ]
+    errors = []
+    lock = threading.Lock()
+
+    def submit(item: Transaction) -> None:
+        with Session(engine) as session:
+            try:
+                write(session, item)
+            except Exception as exc:  # contention errors are counted, not fatal
+                session.rollback()
+                with lock:
+                    errors.append(type(exc).__name__)
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=threads) as pool:
+        list(pool.map(submit, work))
+    elapsed = time.perf_counter() - started
+
+    with Session(engine) as session:
+        ledger = dict(
+            session.exec(select(Transaction.resident_id, func.sum(Transaction.points)).group_by(Transaction.resident_id)).all()
+        )
+        balances = dict(session.exec(select(Resident.id, Resident.token_balance)).all())
+        committed = session.exec(select(func.count()).select_from(Transaction)).one()
+    engine.dispose()
+
+    drift = {rid: balances[rid] - (ledger.get(rid) or 0) for rid in balances if balances[rid] != (ledger.get(rid) or 0)}
+    return {
+        "mode": mode,
+        "threads": threads,
+        "submitted": transactions,
+        "committed": committed,
+        "errors": len(errors),
+        "seconds": round(elapsed, 3),
+        "tx_per_second": round(committed / elapsed, 1),
+        "residents_with_drift": len(drift),
+        "lost_points": -sum(drift.values()),
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--database-url", help="defaults to a temporary SQLite file")
+    parser.add_argument("--threads", type=int, default=32)
+    parser.add_argument("--transactions", type=int, default=5000)
+    parser.add_argument("--residents", type=int, default=5, help="few residents = hot rows")
+    parser.add_argument("--modes", nargs="+", choices=["legacy", "atomic"], default=["legacy", "atomic"])
+    parser.add_argument("--output", type=Path, help="write results as JSON")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        url = args.database_url or f"sqlite:///{Path(tmp) / 'stress.db'}"
+        results = [run(mode, url, args.threads, args.transactions, args.residents) for mode in args.modes]
+
+    for result in results:
+        print(
+            f"{result['mode']:>6}: {result['committed']}/{result['submitted']} committed, "
+            f"{result['tx_per_second']} tx/s, {result['errors']} errors, "
+            f"{result['residents_with_drift']} residents drifted ({result['lost_points']} points lost)"
+        )
+    if args.output:
+        args.output.write_text(json.dumps(results, indent=2))
+    if any(r["mode"] == "atomic" and r["residents_with_drift"] for r in results):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
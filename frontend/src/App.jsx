@@ -10,6 +10,7 @@ import TransactionList from "./TransactionList";
 import ResidentDashboard from "./ResidentDashboard";
 
 const API_BASE = import.meta.env.VITE_API_BASE || "http://127.0.0.1:8080";
+const HISTORY_PAGE_SIZE = 200;
 
 export default function App() {
   const [residents, setResidents] = useState([]);
@@ -27,14 +28,12 @@ export default function App() {
       const [r, g, t] = await Promise.all([
         axios.get(`${API_BASE}/resident/`),
         axios.get(`${API_BASE}/goal/`),
-        axios.get(`${API_BASE}/transaction/`),
+        // server returns newest-first; only the latest page is needed here
+        axios.get(`${API_BASE}/transaction/`, { params: { limit: HISTORY_PAGE_SIZE } }),
       ]);
       setResidents(r.data || []);
       setGoals(g.data || []);
-      // sort newest-first for history
-      const tx = Array.isArray(t.data) ? [...t.data] : [];
-      tx.sort((a, b) => new Date(b.timestamp) - new Date(a.timestamp));
-      setTransactions(tx);
+      setTransactions(Array.isArray(t.data) ? t.data : []);
     } catch (err) {
       console.error("Error loading data:", err);
     } finally {
@@ -1,19 +1,13 @@
 import React, { useState, useEffect } from "react";
-import { fetchResidents, fetchTransactions } from "./api";
+import { fetchResidentSummaries } from "./api";
 
 const ResidentDashboard = () => {
   const [residents, setResidents] = useState([]);
-  const [transactions, setTransactions] = useState([]);
   const [loading, setLoading] = useState(true);
 
   const loadData = async () => {
     try {
-      const [resData, txData] = await Promise.all([
-        fetchResidents(),
-        fetchTransactions(),
-      ]);
-      setResidents(resData);
-      setTransactions(txData);
+      setResidents(await fetchResidentSummaries({ recent: 3 }));
     } catch (error) {
       console.error("Error loading resident dashboard:", error);
     } finally {
@@ -42,7 +36,7 @@ const ResidentDashboard = () => {
       >
         {residents.map((res) => (
           <div
-            key={res.id}
+            key={res.resident_id}
             style={{
               border: "2px solid #ddd",
               borderRadius: "12px",
@@ -71,25 +65,21 @@ const ResidentDashboard = () => {
                 overflowY: "auto",
               }}
             >
-              {transactions
-                .filter((tx) => tx.resident_id === res.id)
-                .slice(-3)
-                .reverse()
-                .map((tx) => (
-                  <li key={tx.id} style={{ marginBottom: "6px" }}>
-                    <span
-                      style={{
-                        color: tx.points >= 0 ? "green" : "red",
-                        fontWeight: "bold",
-                        marginRight: "5px",
-                      }}
-                    >
-                      {tx.points >= 0 ? "➕" : "➖"}
-                    </span>
-                    {tx.points} pts —{" "}
-                    <span style={{ color: "#555" }}>{tx.note || "No note"}</span>
-                  </li>
-                ))}
+              {res.recent_transactions.map((tx) => (
+                <li key={tx.id} style={{ marginBottom: "6px" }}>
+                  <span
+                    style={{
+                      color: tx.points >= 0 ? "green" : "red",
+                      fontWeight: "bold",
+                      marginRight: "5px",
+                    }}
+                  >
+                    {tx.points >= 0 ? "➕" : "➖"}
+                  </span>
+                  {tx.points} pts —{" "}
+                  <span style={{ color: "#555" }}>{tx.note || "No note"}</span>
+                </li>
+              ))}
             </ul>
           </div>
         ))}
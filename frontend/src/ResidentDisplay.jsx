@@ -1,5 +1,5 @@
 import React, { useState, useEffect } from "react";
-import { fetchResidents, fetchTransactions } from "./api";
+import { fetchResidentSummaries, subscribeToChanges } from "./api";
 import { useParams } from "react-router-dom";
 
 const useIsEmbed = () => {
@@ -8,8 +8,7 @@ const useIsEmbed = () => {
 };
 
 const ResidentDisplay = () => {
-  const [residents, setResidents] = useState([]);
-  const [transactions, setTransactions] = useState([]);
+  const [summary, setSummary] = useState(null);
   const [loading, setLoading] = useState(true);
   const { id: routeID } = useParams();
   const selectedId = routeID ? Number(routeID) : null;
@@ -18,12 +17,9 @@ const ResidentDisplay = () => {
   // Fetch data from backend
   const loadData = async () => {
     try {
-      const [resData, txData] = await Promise.all([
-        fetchResidents(),
-        fetchTransactions(),
-      ]);
-      setResidents(resData);
-      setTransactions(txData);
+      if (selectedId === null) return;
+      const [data] = await fetchResidentSummaries({ resident_id: selectedId, recent: 10 });
+      setSummary(data || null);
     } catch (err) {
       console.error("Error loading resident data:", err);
     } finally {
@@ -33,15 +29,22 @@ const ResidentDisplay = () => {
 
   useEffect(() => {
     loadData();
-    const interval = setInterval(loadData, 30000); // Refresh every 30 seconds
-    return () => clearInterval(interval);
+    // Refresh when the server pushes a change to this resident instead of
+    // polling. Every write that moves a balance or the ledger names the
+    // resident's id, so other residents' activity costs this screen nothing.
+    const unsubscribe = subscribeToChanges((event) => {
+      const mine = event.table === "resident" && (event.ids || []).includes(selectedId);
+      if (event.type === "resync" || mine) loadData();
+    });
+    const interval = setInterval(loadData, 300000); // safety net every 5 minutes
+    return () => {
+      unsubscribe();
+      clearInterval(interval);
+    };
   }, []);
 
-  const selectedResident = residents.find((r) => r.id === selectedId);
-  const residentTransactions = transactions
-    .filter((tx) => tx.resident_id === selectedId)
-    .slice(-10)
-    .reverse();
+  const selectedResident = summary;
+  const residentTransactions = summary ? summary.recent_transactions : [];
 
   if (loading) return <p>Loading resident data...</p>;
 
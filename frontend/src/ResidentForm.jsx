@@ -6,7 +6,6 @@ const ResidentForm = ({ onSuccess }) => {
     first_name: "",
     last_name: "",
     display_name: "",
-    token_balance: 0,
   });
 
   const handleChange = (e) => {
@@ -19,7 +18,7 @@ const ResidentForm = ({ onSuccess }) => {
     try {
       await createResident(formData);
       if (onSuccess) onSuccess(); // Refresh list after adding
-      setFormData({ first_name: "", last_name: "", display_name: "", token_balance: 0 });
+      setFormData({ first_name: "", last_name: "", display_name: "" });
     } catch (err) {
       console.error("Error creating resident:", err);
       alert("Failed to create resident. Check console for details.");
@@ -52,14 +51,6 @@ const ResidentForm = ({ onSuccess }) => {
         onChange={handleChange}
         required
       />
-      <input
-        type="number"
-        name="token_balance"
-        placeholder="Starting Tokens"
-        value={formData.token_balance}
-        onChange={handleChange}
-        min="0"
-      />
       <button type="submit">Add Resident</button>
     </form>
   );
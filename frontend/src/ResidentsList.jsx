@@ -1,11 +1,10 @@
 import React, { useEffect, useState } from "react";
-import { fetchResidents, fetchTransactions, fetchGoals } from "./api";
+import { fetchResidents, fetchTransactionDetails } from "./api";
 
 const ResidentsList = () => {
   const [residents, setResidents] = useState([]);
   const [selectedResident, setSelectedResident] = useState(null);
   const [residentTransactions, setResidentTransactions] = useState([]);
-  const [residentGoals, setResidentGoals] = useState([]);
 
   // Load all residents
   useEffect(() => {
@@ -23,14 +22,9 @@ const ResidentsList = () => {
   // Handle resident click
   const handleResidentClick = async (resident) => {
     try {
-      const [transactions, goals] = await Promise.all([
-        fetchTransactions(resident.id),
-        fetchGoals(),
-      ]);
-      setResidentTransactions(
-        transactions.filter((tx) => tx.resident_id === resident.id)
-      );
-      setResidentGoals(goals);
+      // Each transaction carries its goal_title, so no separate goal lookup
+      const { items } = await fetchTransactionDetails({ resident_id: resident.id });
+      setResidentTransactions(items);
       setSelectedResident(resident);
     } catch (err) {
       console.error("Error loading resident data:", err);
@@ -67,7 +61,6 @@ const ResidentsList = () => {
         <ResidentModal
           resident={selectedResident}
           transactions={residentTransactions}
-          goals={residentGoals}
           onClose={handleClose}
         />
       )}
@@ -1,44 +1,50 @@
 import React, { useEffect, useState } from "react";
-import { fetchTransactions, fetchResidents, fetchGoals } from "./api";
+import { fetchTransactionDetails } from "./api";
+
+// Only the columns the table renders
+const DISPLAY_FIELDS = [
+  "id",
+  "resident_display_name",
+  "goal_title",
+  "points",
+  "override_points",
+  "note",
+  "staff_name",
+  "timestamp",
+];
+
+// Newest first, one page at a time; older pages load on demand
+const PAGE_SIZE = 200;
+
+const withDefaults = (items) =>
+  items.map((tx) => ({
+    ...tx,
+    resident_display_name: tx.resident_display_name || "Unknown Resident",
+    goal_title: tx.goal_title || "—",
+    staff_name: tx.staff_name || "—",
+  }));
 
 const TransactionList = () => {
   const [transactions, setTransactions] = useState([]);
+  const [nextCursor, setNextCursor] = useState(null);
   const [loading, setLoading] = useState(true);
+  const [loadingMore, setLoadingMore] = useState(false);
+
+  // Names are joined in by the API; a cursor continues after the last page
+  const loadPage = async (cursor) => {
+    const page = await fetchTransactionDetails({
+      fields: DISPLAY_FIELDS,
+      limit: PAGE_SIZE,
+      ...(cursor ? { cursor } : {}),
+    });
+    const rows = withDefaults(page.items);
+    setTransactions((prev) => (cursor ? [...prev, ...rows] : rows));
+    setNextCursor(page.nextCursor);
+  };
 
   const loadTransactions = async () => {
     try {
-      const [txData, residentData, goalData] = await Promise.all([
-        fetchTransactions(),
-        fetchResidents(),
-        fetchGoals(),
-      ]);
-
-      const residentMap = {};
-      residentData.forEach((r) => {
-        residentMap[r.id] = r.display_name || r.name || "Unknown Resident";
-      });
-
-      const goalMap = {};
-      goalData.forEach((g) => {
-        goalMap[g.id] = g.title || "—";
-      });
-
-      const sortedTx = txData
-        .map((tx) => ({
-          ...tx,
-          resident_display_name:
-            tx.resident_display_name ||
-            residentMap[tx.resident_id] ||
-            "Unknown Resident",
-          goal_title: tx.goal_title || goalMap[tx.goal_id] || "—",
-          staff_name: tx.staff_name || "—",
-        }))
-        .sort(
-          (a, b) =>
-            new Date(b.timestamp).getTime() - new Date(a.timestamp).getTime()
-        );
-
-      setTransactions(sortedTx);
+      await loadPage(null);
     } catch (err) {
       console.error("Error loading transactions:", err);
     } finally {
@@ -46,6 +52,17 @@ const TransactionList = () => {
     }
   };
 
+  const loadOlder = async () => {
+    setLoadingMore(true);
+    try {
+      await loadPage(nextCursor);
+    } catch (err) {
+      console.error("Error loading older transactions:", err);
+    } finally {
+      setLoadingMore(false);
+    }
+  };
+
   useEffect(() => {
     loadTransactions();
   }, []);
@@ -104,6 +121,13 @@ const TransactionList = () => {
           ))}
         </tbody>
       </table>
+      {nextCursor && (
+        <div style={{ textAlign: "center", marginTop: "12px" }}>
+          <button onClick={loadOlder} disabled={loadingMore}>
+            {loadingMore ? "Loading..." : "Load older transactions"}
+          </button>
+        </div>
+      )}
     </div>
   );
 };
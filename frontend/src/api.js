@@ -3,6 +3,19 @@ import axios from "axios";
 // ✅ FastAPI backend base URL
 export const API_BASE_URL = import.meta.env.VITE_API_BASE;
 
+// =====================
+// Live updates (Server-Sent Events)
+// =====================
+// Calls onChange(event) for every committed change and on "resync" (the
+// stream fell behind; refetch). Returns a function that closes the stream.
+export const subscribeToChanges = (onChange) => {
+  const source = new EventSource(`${API_BASE_URL}/events`);
+  const forward = (e) => onChange(JSON.parse(e.data));
+  source.addEventListener("change", forward);
+  source.addEventListener("resync", forward);
+  return () => source.close();
+};
+
 // =====================
 // Residents
 // =====================
@@ -11,6 +24,12 @@ export const fetchResidents = async () => {
   return response.data;
 };
 
+// Balance, today/week/all-time points and latest transactions per resident
+export const fetchResidentSummaries = async (params = {}) => {
+  const response = await axios.get(`${API_BASE_URL}/resident/summary`, { params });
+  return response.data;
+};
+
 export const createResident = async (residentData) => {
   const response = await axios.post(`${API_BASE_URL}/resident/`, residentData);
   return response.data;
@@ -32,11 +51,27 @@ export const createGoal = async (goalData) => {
 // =====================
 // Transactions
 // =====================
-export const fetchTransactions = async () => {
-  const response = await axios.get(`${API_BASE_URL}/transaction/`);
+// Newest-first. Pass { limit, cursor, resident_id, goal_id, staff_name, start, end };
+// when a limit is given, the next page's cursor comes back in X-Next-Cursor.
+export const fetchTransactions = async (params = {}) => {
+  const response = await axios.get(`${API_BASE_URL}/transaction/`, { params });
   return response.data;
 };
 
+// Same filters and paging, with resident_display_name and goal_title joined in
+// server-side. Optional `fields` (array or comma string) trims each row to those
+// keys; `include` ("resident", "goal") nests the full related records.
+export const fetchTransactionDetails = async ({ fields, include, ...params } = {}) => {
+  const response = await axios.get(`${API_BASE_URL}/transaction/detailed`, {
+    params: {
+      ...params,
+      ...(fields ? { fields: [].concat(fields).join(",") } : {}),
+      ...(include ? { include: [].concat(include).join(",") } : {}),
+    },
+  });
+  return { items: response.data, nextCursor: response.headers["x-next-cursor"] || null };
+};
+
 export const createTransaction = async (tx) => {
   const payload = {
     ...tx,